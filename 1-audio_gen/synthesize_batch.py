@@ -1,14 +1,26 @@
 import os
+import sys
 import time
 from pathlib import Path
-from openai import OpenAI
 from dotenv import load_dotenv
-from pydub import AudioSegment
 import math
 
+# Shared helpers live in utils/ at the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.script_corpus import scan_scripts
+
 # --- Configuration ---
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+_client = None
+
+def get_client():
+    """Creates the OpenAI client on first use, so listing scripts and aborting at the prompt stay fast."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 SELECTED_SCRIPTS_DIR = Path("selected_scripts")
 BASE_AUDIO_OUTPUT_DIR = Path("1-audio_gen/output_audio")
@@ -21,6 +33,34 @@ PROJECT_AUDIO_OUTPUT_DIR = BASE_AUDIO_OUTPUT_DIR / PROJECT_NAME
 CHUNK_LIMIT = 3500
 WORDS_PER_SECOND_ESTIMATE = 2.5
 
+# --- Audio Format ---
+# "mp3" keeps the legacy output. "m4a" encodes AAC once here so stages 2 and 3 can
+# stream-copy it into the videos. "wav" is a lossless intermediate (encoded once in stage 2).
+AUDIO_FORMAT = "mp3"
+AUDIO_EXPORT_SETTINGS = {
+    "mp3": {"format": "mp3"},
+    # 44.1 kHz stereo, the same layout moviepy writes, so stage 3 can join every clip's audio by stream copy
+    "m4a": {"format": "ipod", "codec": "aac", "bitrate": "192k", "parameters": ["-ar", "44100", "-ac", "2"]},
+    "wav": {"format": "wav"},
+}
+# Chunks are requested lossless so the export above is the only lossy encode.
+TTS_RESPONSE_FORMAT = "flac"
+
+# --- Batched Requests for Short Scripts ---
+# Consecutive short scripts are sent as one TTS request with a pause marker between them, and the
+# returned audio is split back into per-script files at the long silences the markers produce.
+# If the split is ambiguous the batch falls back to one request per script.
+BATCH_SHORT_SCRIPTS = False
+SHORT_SCRIPT_WORD_LIMIT = 60        # Scripts with at most this many words can be batched
+MAX_SCRIPTS_PER_REQUEST = 6
+BATCH_PAUSE_MARKER = "\n\n. . . . . .\n\n"
+BATCH_PAUSE_INSTRUCTION = """
+Pauses: Lines made only of dots separate independent segments. Do not read them aloud; stay completely silent for about two seconds at each one.
+"""
+SILENCE_THRESHOLD_DBFS = -45.0      # 20 ms windows quieter than this count as silence
+MIN_SPLIT_SILENCE_SEC = 1.2         # Shortest silence accepted as a segment boundary
+KEEP_SILENCE_SEC = 0.3              # Silence left at each edge of a split-off segment
+
 # --- TTS Voice Instructions (Unchanged) ---
 TTS_INSTRUCTIONS = """
 Voice: Confident, dynamic, and charismatic, with a clear and compelling cadence that makes complex topics feel exciting and easy to understand. The voice should have a natural energy that builds anticipation.
@@ -54,6 +94,100 @@ def format_seconds_to_min_sec(seconds: float) -> str:
     time_str += f"{remaining_seconds} sec"
     return time_str
 
+# --- TTS Request Helpers ---
+def request_speech(client, text: str, temp_path: Path, instructions: str = TTS_INSTRUCTIONS):
+    """Synthesizes one piece of text and returns it as a pydub AudioSegment."""
+    from pydub import AudioSegment
+
+    with client.audio.speech.with_streaming_response.create(
+        model="gpt-4o-mini-tts",
+        voice="echo",
+        instructions=instructions,
+        input=text,
+        response_format=TTS_RESPONSE_FORMAT
+    ) as response:
+        response.stream_to_file(temp_path)
+    
+    audio = AudioSegment.from_file(temp_path, format=TTS_RESPONSE_FORMAT)
+    os.remove(temp_path)
+    return audio
+
+def plan_short_script_batches(script_files: list[Path]) -> list[list[Path]]:
+    """Groups runs of consecutive short scripts into batches of 2 to MAX_SCRIPTS_PER_REQUEST."""
+    batches = []
+    current = []
+    current_chars = 0
+    for script_path in script_files + [None]:
+        text = script_path.read_text(encoding="utf-8").strip() if script_path else ""
+        is_short = script_path is not None and len(text.split()) <= SHORT_SCRIPT_WORD_LIMIT
+        fits = current_chars + len(text) + len(BATCH_PAUSE_MARKER) < CHUNK_LIMIT
+        if is_short and fits and len(current) < MAX_SCRIPTS_PER_REQUEST:
+            current.append(script_path)
+            current_chars += len(text) + len(BATCH_PAUSE_MARKER)
+            continue
+        if len(current) > 1:
+            batches.append(current)
+        current = [script_path] if is_short else []
+        current_chars = len(text) + len(BATCH_PAUSE_MARKER) if is_short else 0
+    return batches
+
+def split_batch_audio(audio, word_counts: list[int]) -> list | None:
+    """
+    Splits the audio of a batched request into one segment per script at the longest interior
+    silences. Returns None when the split is ambiguous: too few long silences, no clear gap between
+    the boundary silences and ordinary pauses, or segment lengths that don't match the word counts.
+    """
+    import numpy as np
+
+    num_segments = len(word_counts)
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32).reshape(-1, audio.channels).mean(axis=1)
+    window = max(1, int(audio.frame_rate * 0.02))
+    num_windows = len(samples) // window
+    frames = samples[:num_windows * window].reshape(num_windows, window)
+    full_scale = float(1 << (8 * audio.sample_width - 1))
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    silent = 20 * np.log10(rms / full_scale + 1e-10) < SILENCE_THRESHOLD_DBFS
+
+    # Run-length encode the silent windows and keep the runs strictly inside the audio
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    interior = (run_starts > 0) & (run_ends < num_windows)
+    run_starts, run_ends = run_starts[interior], run_ends[interior]
+    run_lengths = (run_ends - run_starts) * window / audio.frame_rate
+
+    needed = num_segments - 1
+    order = np.argsort(run_lengths)[::-1]
+    if len(order) < needed or run_lengths[order[needed - 1]] < MIN_SPLIT_SILENCE_SEC:
+        return None
+    if len(order) > needed and run_lengths[order[needed]] >= 0.8 * run_lengths[order[needed - 1]]:
+        return None  # The next-longest pause is about as long as a boundary: can't tell them apart
+
+    boundaries = sorted(order[:needed])
+    window_ms = window * 1000 / audio.frame_rate
+    keep_ms = KEEP_SILENCE_SEC * 1000
+    cut_points = [0.0]
+    for b in boundaries:
+        cut_points.append(run_starts[b] * window_ms + keep_ms)   # end of the segment before the pause
+        cut_points.append(run_ends[b] * window_ms - keep_ms)     # start of the segment after it
+    cut_points.append(len(audio))
+    segments = [audio[int(cut_points[i]):int(cut_points[i + 1])] for i in range(0, len(cut_points), 2)]
+
+    # Each segment's share of the speech should roughly match its share of the words
+    durations = np.array([len(segment) for segment in segments], dtype=np.float64)
+    words = np.array(word_counts, dtype=np.float64)
+    ratios = (durations / durations.sum()) / (words / words.sum())
+    if np.any(ratios < 0.5) or np.any(ratios > 2.0):
+        return None
+    return segments
+
+def synthesize_short_batch(client, batch: list[Path]) -> list | None:
+    texts = [script_path.read_text(encoding="utf-8").strip() for script_path in batch]
+    temp_path = PROJECT_AUDIO_OUTPUT_DIR / f"temp_batch.{TTS_RESPONSE_FORMAT}"
+    audio = request_speech(client, BATCH_PAUSE_MARKER.join(texts), temp_path,
+                           TTS_INSTRUCTIONS + BATCH_PAUSE_INSTRUCTION)
+    return split_batch_audio(audio, [max(1, len(text.split())) for text in texts])
+
 # --- Main Synthesis Function ---
 def synthesize_batch_scripts():
     print("\n--- Stark Audio Synthesis Prototype (Batch Mode) ---")
@@ -73,22 +207,26 @@ def synthesize_batch_scripts():
     ### --- NEW: Accumulator for total estimated time --- ###
     total_estimated_seconds = 0.0
 
+    # Word and chunk counts come from the script corpus cache, so only new or edited scripts are read
+    corpus = scan_scripts([SELECTED_SCRIPTS_DIR], CHUNK_LIMIT, recursive=False)
+    total_chunks = 0
+
     for i, script_path in enumerate(script_files):
-        try:
-            content = script_path.read_text(encoding='utf-8')
-            words = len(content.split())
-            estimated_seconds = words / WORDS_PER_SECOND_ESTIMATE
-            ### --- NEW: Add this script's time to the total --- ###
-            total_estimated_seconds += estimated_seconds
-            estimated_time_str = format_seconds_to_min_sec(estimated_seconds)
-            print(f"  {i+1}. {script_path.name} --> {words} words --> {estimated_time_str}")
-        except Exception as e:
-            print(f"  {i+1}. Error reading {script_path.name}: {e}")
+        stats = corpus["scripts"].get(script_path.as_posix(), {"error": "not found by the corpus scan"})
+        if "error" in stats:
+            print(f"  {i+1}. Error reading {script_path.name}: {stats['error']}")
+            continue
+        estimated_seconds = stats["words"] / WORDS_PER_SECOND_ESTIMATE
+        ### --- NEW: Add this script's time to the total --- ###
+        total_estimated_seconds += estimated_seconds
+        total_chunks += stats["chunks"]
+        estimated_time_str = format_seconds_to_min_sec(estimated_seconds)
+        print(f"  {i+1}. {script_path.name} --> {stats['words']} words --> {stats['chunks']} chunks --> {estimated_time_str}")
 
     ### --- NEW: Display the total estimated time --- ###
     formatted_total_time = format_seconds_to_min_sec(total_estimated_seconds)
     print("----------------------------------------------------------")
-    print(f"Total Estimated Audio Length: {formatted_total_time}")
+    print(f"Total Estimated Audio Length: {formatted_total_time} ({total_chunks} TTS chunks)")
     print("----------------------------------------------------------")
 
 
@@ -113,9 +251,45 @@ def synthesize_batch_scripts():
 
     print("\nStarting Batch Synthesis...")
 
+    # Heavy audio/API libraries are only loaded once synthesis actually starts
+    from pydub import AudioSegment
+    client = get_client()
+
+    # --- Batched Requests for Short Scripts ---
+    individual_scripts = list(script_files)
+    if BATCH_SHORT_SCRIPTS:
+        batches = plan_short_script_batches(script_files)
+        print(f"\n{sum(len(batch) for batch in batches)} short scripts packed into {len(batches)} batched requests.")
+        for i, batch in enumerate(batches):
+            print(f"\n--- Batched Request {i+1}/{len(batches)}: {', '.join(p.name for p in batch)} ---")
+            synthesis_start_time = time.time()
+            try:
+                segments = synthesize_short_batch(client, batch)
+            except Exception as e:
+                print(f"Error synthesizing batch: {e}")
+                segments = None
+            total_synthesis_time += time.time() - synthesis_start_time
+
+            if segments is None:
+                print("  Could not split the batch audio cleanly. Falling back to one request per script.")
+                continue
+
+            for script_path, segment in zip(batch, segments):
+                output_audio_path = PROJECT_AUDIO_OUTPUT_DIR / f"{script_path.stem}.{AUDIO_FORMAT}"
+                try:
+                    segment.export(output_audio_path, **AUDIO_EXPORT_SETTINGS[AUDIO_FORMAT])
+                except Exception as e:
+                    # Left in individual_scripts, so it gets its own request below
+                    print(f"Error saving {script_path.name} from the batch: {e}. It will be synthesized on its own.")
+                    continue
+                individual_scripts.remove(script_path)
+                total_files_processed += 1
+                print(f"Done! [Audio File: {output_audio_path}] ({format_seconds_to_min_sec(len(segment) / 1000)})")
+            print(f"Time Taken: {format_seconds_to_min_sec(time.time() - synthesis_start_time)}")
+
     # --- Core Synthesis Loop (Unchanged) ---
-    for i, script_path in enumerate(script_files):
-        print(f"\n--- Processing {i+1}/{len(script_files)}: {script_path.name} ---")
+    for i, script_path in enumerate(individual_scripts):
+        print(f"\n--- Processing {i+1}/{len(individual_scripts)}: {script_path.name} ---")
         
         try:
             text_content = script_path.read_text(encoding="utf-8")
@@ -131,26 +305,17 @@ def synthesize_batch_scripts():
             synthesis_start_time = time.time()
 
             for j, chunk in enumerate(chunks):
-                temp_chunk_path = PROJECT_AUDIO_OUTPUT_DIR / f"temp_chunk_{j+1}.mp3"
-                with client.audio.speech.with_streaming_response.create(
-                    model="gpt-4o-mini-tts",
-                    voice="echo",
-                    instructions=TTS_INSTRUCTIONS,
-                    input=chunk
-                ) as response:
-                    response.stream_to_file(temp_chunk_path)
-                
-                combined_audio += AudioSegment.from_mp3(temp_chunk_path)
-                os.remove(temp_chunk_path)
+                temp_chunk_path = PROJECT_AUDIO_OUTPUT_DIR / f"temp_chunk_{j+1}.{TTS_RESPONSE_FORMAT}"
+                combined_audio += request_speech(client, chunk, temp_chunk_path)
 
             actual_time_taken = time.time() - synthesis_start_time
             total_synthesis_time += actual_time_taken
             total_files_processed += 1
             
-            output_audio_filename = script_path.stem + ".mp3"
+            output_audio_filename = f"{script_path.stem}.{AUDIO_FORMAT}"
             output_audio_path = PROJECT_AUDIO_OUTPUT_DIR / output_audio_filename
 
-            combined_audio.export(output_audio_path, format="mp3")
+            combined_audio.export(output_audio_path, **AUDIO_EXPORT_SETTINGS[AUDIO_FORMAT])
             
             print(f"Done! [Audio File: {output_audio_path}]")
             print(f"Time Taken: {format_seconds_to_min_sec(actual_time_taken)}")
@@ -1,14 +1,26 @@
 import os
+import sys
 from pathlib import Path
-from openai import OpenAI
 from dotenv import load_dotenv
-from pydub import AudioSegment
 import math
 
+# Shared helpers live in utils/ at the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.script_corpus import scan_scripts, format_seconds_to_min_sec
+
 # --- Configuration ---
 # Load API key from .env file (ensure .env is in the project root)
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+_client = None
+
+def get_client():
+    """Creates the OpenAI client on first use, so listing scripts and aborting at the prompt stay fast."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 # Define input and output directories relative to the script's location (project root)
 SELECTED_SCRIPTS_DIR = Path("selected_scripts")
@@ -16,6 +28,20 @@ OUTPUT_AUDIO_DIR = Path("1-audio_gen/output_audio")
 
 # Text chunk limit for OpenAI TTS (as per your existing code)
 CHUNK_LIMIT = 3500
+WORDS_PER_SECOND_ESTIMATE = 2.5
+
+# --- Audio Format ---
+# "mp3" keeps the legacy output. "m4a" encodes AAC once here so stages 2 and 3 can
+# stream-copy it into the videos. "wav" is a lossless intermediate (encoded once in stage 2).
+AUDIO_FORMAT = "mp3"
+AUDIO_EXPORT_SETTINGS = {
+    "mp3": {"format": "mp3"},
+    # 44.1 kHz stereo, the same layout moviepy writes, so stage 3 can join every clip's audio by stream copy
+    "m4a": {"format": "ipod", "codec": "aac", "bitrate": "192k", "parameters": ["-ar", "44100", "-ac", "2"]},
+    "wav": {"format": "wav"},
+}
+# Chunks are requested lossless so the export above is the only lossy encode.
+TTS_RESPONSE_FORMAT = "flac"
 
 # --- TTS Voice Instructions ---
 # These instructions guide the OpenAI TTS model's delivery
@@ -77,9 +103,17 @@ def synthesize_single_script():
         print(f"No .txt script files found in '{SELECTED_SCRIPTS_DIR}'. Please place your scripts there.")
         return
 
+    # Word and chunk counts come from the script corpus cache, so only new or edited scripts are read
+    corpus = scan_scripts([SELECTED_SCRIPTS_DIR], CHUNK_LIMIT, recursive=False)
+
     print("\nAvailable script files:")
     for i, script_name in enumerate(available_scripts):
-        print(f"  {i+1}. {script_name}")
+        stats = corpus["scripts"].get((SELECTED_SCRIPTS_DIR / script_name).as_posix(), {})
+        if "words" in stats:
+            estimated_time_str = format_seconds_to_min_sec(stats["words"] / WORDS_PER_SECOND_ESTIMATE)
+            print(f"  {i+1}. {script_name} --> {stats['words']} words --> {stats['chunks']} chunks --> {estimated_time_str}")
+        else:
+            print(f"  {i+1}. {script_name}")
 
     # User input for filename
     # script_filename = input("\nEnter the script filename you want to synthesize (e.g., n8n_hosting_script_1.0.txt): ").strip()
@@ -136,15 +170,19 @@ def synthesize_single_script():
 
     # Determine output audio filename
     # Example: n8n_hosting_script_1.0.txt -> n8n_hosting_script_1.0.mp3
-    output_audio_filename = script_path.stem + ".mp3"
+    output_audio_filename = f"{script_path.stem}.{AUDIO_FORMAT}"
     output_audio_path = OUTPUT_AUDIO_DIR / output_audio_filename
 
+    # Heavy audio/API libraries are only loaded once synthesis actually starts
+    from pydub import AudioSegment
+    client = get_client()
+
     combined_audio = AudioSegment.empty()
 
     print("\nStarting to Synthesize Audio Chunks...")
 
     for i, chunk in enumerate(chunks):
-        temp_chunk_path = OUTPUT_AUDIO_DIR / f"temp_chunk_{i+1}.mp3"
+        temp_chunk_path = OUTPUT_AUDIO_DIR / f"temp_chunk_{i+1}.{TTS_RESPONSE_FORMAT}"
         print(f"  Synthesizing chunk {i+1}/{len(chunks)}...")
         
         try:
@@ -160,11 +198,12 @@ def synthesize_single_script():
                 # voice="fable",
                 # voice="ash",
                 instructions=TTS_INSTRUCTIONS, # Your detailed voice instructions
-                input=chunk
+                input=chunk,
+                response_format=TTS_RESPONSE_FORMAT # Lossless chunks, encoded once on export
             ) as response:
                 response.stream_to_file(temp_chunk_path)
             
-            combined_audio += AudioSegment.from_mp3(temp_chunk_path)
+            combined_audio += AudioSegment.from_file(temp_chunk_path, format=TTS_RESPONSE_FORMAT)
             os.remove(temp_chunk_path) # Clean up temporary chunk file
 
         except Exception as e:
@@ -174,7 +213,7 @@ def synthesize_single_script():
             break # Abort the current synthesis on error
 
     if combined_audio: # Only export if audio was actually synthesized
-        combined_audio.export(output_audio_path, format="mp3")
+        combined_audio.export(output_audio_path, **AUDIO_EXPORT_SETTINGS[AUDIO_FORMAT])
         print(f"\nSuccessfully synthesized and saved audio to: {output_audio_path}")
     else:
         print("\nAudio synthesis failed or produced no output.")
@@ -1,13 +1,18 @@
 import os
 import re
+import sys
 import time
+import shutil
 from pathlib import Path
-from moviepy.video.VideoClip import ImageClip
-from moviepy.audio.io.AudioFileClip import AudioFileClip
 
-from PIL import Image, ImageOps
-from PIL.Image import Resampling
-import numpy as np
+# Shared helpers live in utils/ at the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.render_pool import AdaptiveWorkerPool
+from utils.job_queue import QueueCoordinator
+from utils.render_plan import plan_path, load_plan, save_plan, cached_duration
+from utils.screen_hash import group_duplicate_screens
+from utils.ffmpeg_tools import run_ffmpeg
+from utils.audio_preflight import run_preflight
 
 # --- Configuration ---
 PROJECT_NAME = "coach-dashboard"
@@ -16,6 +21,54 @@ AUDIO_INPUT_DIR = Path("1-audio_gen/output_audio") / PROJECT_NAME
 CLIPS_OUTPUT_DIR = Path("2-video_clip_gen/output_clips") / PROJECT_NAME
 VIDEO_SIZE = (1920, 1080)
 FPS = 24
+ENCODER_PRESET = 'medium'
+
+# --- Preview Mode ---
+# Renders the same pairs at a reduced size and frame rate with the fastest encoder settings into
+# CLIPS_OUTPUT_DIR/preview, so pacing and slide order can be reviewed before the full export.
+# Probed durations are cached in the render plan, so the final render doesn't probe the audio again.
+PREVIEW_MODE = False
+PREVIEW_SIZE = (640, 360)
+PREVIEW_FPS = 12
+PREVIEW_PRESET = 'ultrafast'
+PREVIEW_OUTPUT_DIR = CLIPS_OUTPUT_DIR / "preview"
+
+# Narration formats produced by stage 1. AAC (.m4a) audio is stream-copied into the clip;
+# anything else is encoded to AAC here.
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.wav')
+AUDIO_FORMAT = "mp3"   # Keep in step with AUDIO_FORMAT in stage 1; it wins when a stem has several formats
+STREAM_COPY_AUDIO_EXTENSIONS = ('.m4a',)
+
+# --- Audio Pre-flight ---
+# Before anything is encoded, every narration file is decoded and checked for long silences,
+# clipping, sudden level jumps and a duration that doesn't fit its script's word count
+# (thresholds in utils/audio_preflight.py). "block" drops failing pairs from the render,
+# "flag" only lists them, None skips the check.
+PREFLIGHT_MODE = "block"
+SELECTED_SCRIPTS_DIR = Path("selected_scripts")
+
+# --- Repeated Screens ---
+# Byte-identical screens are encoded once as a silent still-video track, and each clip that uses
+# one gets its own narration muxed onto that track by stream copy. Raising DUPLICATE_HASH_DISTANCE
+# also groups re-exported copies: screens within that many dHash bits (out of 64) are compared at
+# full resolution and only grouped when their pixels match (see utils/screen_hash.py).
+REUSE_DUPLICATE_SCREENS = True
+DUPLICATE_HASH_DISTANCE = 0
+
+# --- Parallel Rendering ---
+# Clips render in worker processes; the pool grows and shrinks between these limits
+# based on CPU load, free memory and free disk space.
+MIN_WORKERS = 1
+MAX_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+MEMORY_BUDGET_MB = 6144   # Hard cap on the combined RSS of all clip workers and their ffmpeg writers
+MIN_FREE_DISK_MB = 2048
+
+# --- Distributed Rendering ---
+# Point this at a directory on shared storage (e.g. an NFS mount) to publish clip jobs there
+# instead of rendering on this machine. Run the project from the shared mount and start workers
+# on each node from the project root with: python utils/render_worker.py <queue dir>
+DISTRIBUTED_QUEUE_DIR = None
+LOCAL_QUEUE_WORKERS = 0   # Queue workers to also start on this machine (handy for single-machine runs)
 
 # --- Helper Function for Time Formatting ---
 def format_seconds_to_min_sec(seconds: float) -> str:
@@ -39,6 +92,116 @@ def natural_sort_key(file_path: Path) -> int:
     # Fallback for any files that might not end in a number
     return 0
 
+def build_audio_map(audio_files: list[Path]) -> dict[str, Path]:
+    """
+    Maps each stem to its narration file. A stem with files in several formats (left behind when
+    stage 1's AUDIO_FORMAT changed) uses the AUDIO_FORMAT file; without one it is ambiguous and skipped.
+    """
+    files_by_stem = {}
+    for path in audio_files:
+        files_by_stem.setdefault(path.stem, []).append(path)
+
+    audio_map = {}
+    for stem, paths in files_by_stem.items():
+        if len(paths) == 1:
+            audio_map[stem] = paths[0]
+            continue
+        names = ", ".join(sorted(p.name for p in paths))
+        preferred = [p for p in paths if p.suffix.lower() == f".{AUDIO_FORMAT}"]
+        if preferred:
+            audio_map[stem] = preferred[0]
+            print(f"  Note: several narration files for '{stem}' ({names}); using {preferred[0].name}.")
+        else:
+            print(f"  Warning: several narration files for '{stem}' ({names}) and none is .{AUDIO_FORMAT}; skipping it.")
+    return audio_map
+
+# --- Clip Rendering (runs inside a pool worker) ---
+def render_clip(item: dict) -> float:
+    """
+    Renders one image/audio pair to an mp4 clip and returns the clip duration in seconds.
+    Output size, frame rate, preset and folder come from the job so preview and final jobs can share workers.
+    A 'still' job renders a silent track for a repeated screen to job['output'] instead.
+    Runs in a worker process (local pool or queue worker), so errors are raised back instead of printed.
+    """
+    # Media libraries are imported here, in the worker, so listing pairs stays fast
+    from moviepy.video.VideoClip import ImageClip
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from PIL import Image, ImageOps
+    from PIL.Image import Resampling
+    import numpy as np
+
+    image_path = Path(item['image'])
+    is_still = item.get('kind') == 'still'
+    audio_path = None if is_still else Path(item['audio'])
+    logical_id = item['id'] # Use the stored ID
+
+    if is_still:
+        print(f"\n--- Processing Shared Screen: {image_path.name} (used by {item['uses']} clips) ---")
+    else:
+        print(f"\n--- Processing Clip {item['position']}/{item['total']}: {image_path.name} & {audio_path.name} ---")
+
+    audio_clip = video_clip = final_video_clip = None
+    try:
+        # The duration was probed while planning, so the audio is only opened if it has to be re-encoded
+        clip_duration = item['duration']
+
+        print(f"  Clip Duration (from audio): {format_seconds_to_min_sec(clip_duration)}")
+
+        img = Image.open(image_path).convert("RGB")
+        img = ImageOps.exif_transpose(img)
+        img = img.resize(tuple(item['size']), Resampling.LANCZOS)
+        img_array = np.array(img)
+        
+        video_clip = ImageClip(img_array, duration=clip_duration)
+        if is_still:
+            final_video_clip = video_clip
+            audio_source = False
+        elif audio_path.suffix.lower() in STREAM_COPY_AUDIO_EXTENSIONS:
+            # Mux the AAC narration as-is instead of decoding and re-encoding it
+            final_video_clip = video_clip
+            audio_source = str(audio_path)
+        else:
+            audio_clip = AudioFileClip(str(audio_path))
+            final_video_clip = video_clip.with_audio(audio_clip)
+            audio_source = True
+
+        ### --- SECTION 3: UPDATED OUTPUT FILENAME LOGIC --- ###
+        # Use the simple logical_id (stem) for the output filename
+        output_clip_filename = f"{PROJECT_NAME}_clip_{logical_id}.mp4"
+        output_clip_path = Path(item['output']) if is_still else Path(item['output_dir']) / output_clip_filename
+
+        print(f"  Generating clip to: {output_clip_path}...")
+        final_video_clip.write_videofile(
+            str(output_clip_path),
+            fps=item['fps'],
+            codec='libx264',
+            audio=audio_source,
+            audio_codec='aac',
+            preset=item['preset'],
+            logger=None
+        )
+        return clip_duration
+    finally:
+        if audio_clip:
+            audio_clip.close()
+        if video_clip:
+            video_clip.close()
+        if final_video_clip:
+            final_video_clip.close()
+
+def mux_narration(still_path: Path, audio_path: Path, duration: float, output_path: Path):
+    """
+    Builds a clip from a shared still-video track and its own narration, copying the video stream.
+    Re-encoded narration uses the same 44.1 kHz stereo AAC moviepy writes, so stage 3 can join the
+    audio of muxed and rendered clips by stream copy.
+    """
+    if audio_path.suffix.lower() in STREAM_COPY_AUDIO_EXTENSIONS:
+        audio_args = ["-c:a", "copy"]
+    else:
+        audio_args = ["-c:a", "aac", "-b:a", "192k", "-ar", "44100", "-ac", "2"]
+    run_ffmpeg(["-i", str(still_path), "-i", str(audio_path), "-map", "0:v", "-map", "1:a",
+                "-c:v", "copy", *audio_args, "-t", f"{duration:.6f}", str(output_path)])
+
 # --- Main Clip Generation Function ---
 def generate_individual_clips():
     """
@@ -47,6 +210,8 @@ def generate_individual_clips():
     """
     print("\n--- Stark Individual Video Clip Generator ---")
     print(f"Project: {PROJECT_NAME}")
+    if PREVIEW_MODE:
+        print(f"Mode: PREVIEW ({PREVIEW_SIZE[0]}x{PREVIEW_SIZE[1]} @ {PREVIEW_FPS} fps)")
 
     if not SELECTED_SCREENS_DIR.exists():
         print(f"Error: Selected screens directory '{SELECTED_SCREENS_DIR}' not found.")
@@ -66,8 +231,9 @@ def generate_individual_clips():
             print("Understood. Aborting script.")
         return # Stop the script either way, as the new folder will be empty.
 
-    CLIPS_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    print(f"Output clips will be saved to: {CLIPS_OUTPUT_DIR}")
+    output_dir = PREVIEW_OUTPUT_DIR if PREVIEW_MODE else CLIPS_OUTPUT_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Output clips will be saved to: {output_dir}")
 
     ### --- SECTION 2: SIMPLIFIED FILE MATCHING LOGIC --- ###
     print("\nMatching images to audio files based on filename...")
@@ -78,13 +244,13 @@ def generate_individual_clips():
         key=natural_sort_key
     )
     audio_files = sorted(
-        [f for f in AUDIO_INPUT_DIR.iterdir() if f.is_file() and f.suffix.lower() == '.mp3'],
+        [f for f in AUDIO_INPUT_DIR.iterdir() if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS],
         key=natural_sort_key
     )
 
     # 2. Create a dictionary mapping the filename stem to the full path for quick lookups
     image_map = {p.stem: p for p in image_files}
-    audio_map = {p.stem: p for p in audio_files}
+    audio_map = build_audio_map(audio_files)
 
     # 3. Find the common stems (logical IDs) that exist in both directories
     common_stems = sorted(
@@ -107,9 +273,54 @@ def generate_individual_clips():
         print("\nPlease ensure that for every 'name-0001.jpg' in '_selected_screens', there is a corresponding 'name-0001.mp3' in the audio output directory.")
         return
 
+    # 5. Probe the audio durations, reusing the saved render plan for files that haven't changed
+    render_plan_path = plan_path(CLIPS_OUTPUT_DIR, PROJECT_NAME)
+    render_plan = load_plan(render_plan_path)
+    duration_cache = render_plan.setdefault('durations', {})
+    planned_total_sec = 0.0
+    for item in paired_items:
+        try:
+            item['duration'] = cached_duration(duration_cache, item['audio'])
+            planned_total_sec += item['duration']
+        except Exception as e:
+            item['duration'] = None
+            item['error'] = str(e)
+
+    # 6. Check the narration itself, so no render time is spent on audio we would reject
+    if PREFLIGHT_MODE:
+        print("Running the audio pre-flight...")
+        preflight = run_preflight(
+            [item['audio'] for item in paired_items if item['duration'] is not None],
+            SELECTED_SCRIPTS_DIR if SELECTED_SCRIPTS_DIR.exists() else None,
+            cache=render_plan.setdefault('audio_checks', {})
+        )
+        for item in paired_items:
+            item['problems'] = preflight.get(item['audio'], [])
+
+    render_plan.pop('clips', None)   # Planned clip list written by earlier versions; nothing reads it
+    save_plan(render_plan_path, render_plan)
+
     print(f"\nFound {len(paired_items)} matching image-audio pairs to process:")
     for i, item in enumerate(paired_items):
-        print(f"  {i+1}. Image: {item['image'].name} | Audio: {item['audio'].name}")
+        if item['duration'] is None:
+            print(f"  {i+1}. Image: {item['image'].name} | Audio: {item['audio'].name} --> unreadable audio ({item['error']}), skipping")
+        elif item.get('problems'):
+            action = "skipping" if PREFLIGHT_MODE == "block" else "check before publishing"
+            print(f"  {i+1}. Image: {item['image'].name} | Audio: {item['audio'].name} --> "
+                  f"FAILED pre-flight ({'; '.join(item['problems'])}), {action}")
+        else:
+            print(f"  {i+1}. Image: {item['image'].name} | Audio: {item['audio'].name} ({format_seconds_to_min_sec(item['duration'])})")
+    flagged = [item for item in paired_items if item.get('problems')]
+    if flagged:
+        print(f"{len(flagged)} narration files failed the audio pre-flight.")
+    paired_items = [item for item in paired_items if item['duration'] is not None]
+    if PREFLIGHT_MODE == "block":
+        paired_items = [item for item in paired_items if not item.get('problems')]
+        planned_total_sec = sum(item['duration'] for item in paired_items)
+    print(f"Planned total length: {format_seconds_to_min_sec(planned_total_sec)}")
+    if not paired_items:
+        print("None of the paired audio files could be read or passed the pre-flight. Aborting clip generation.")
+        return
 
     proceed = input("\nDoes the list of pairs look good to proceed? (y/n): ").lower().strip()
     if proceed != 'y':
@@ -121,62 +332,103 @@ def generate_individual_clips():
     
     print("\nStarting Individual Clip Generation...")
 
-    for i, item in enumerate(paired_items):
-        image_path = item['image']
-        audio_path = item['audio']
-        logical_id = item['id'] # Use the stored ID
-        clip_start_time = time.time()
+    render_settings = {
+        'size': PREVIEW_SIZE if PREVIEW_MODE else VIDEO_SIZE,
+        'fps': PREVIEW_FPS if PREVIEW_MODE else FPS,
+        'preset': PREVIEW_PRESET if PREVIEW_MODE else ENCODER_PRESET,
+        'output_dir': output_dir,
+    }
+    items = [dict(item, position=i + 1, total=len(paired_items), **render_settings)
+             for i, item in enumerate(paired_items)]
 
-        print(f"\n--- Processing Clip {i+1}/{len(paired_items)}: {image_path.name} & {audio_path.name} ---")
+    # Group repeated screens: each group is encoded once and shared by all of its clips
+    screen_groups = {}
+    if REUSE_DUPLICATE_SCREENS:
+        print("Checking for repeated screens...")
+        screen_map = group_duplicate_screens(
+            [item['image'] for item in items], DUPLICATE_HASH_DISTANCE, render_plan.setdefault('screen_hashes', {}),
+            compare_size=tuple(render_settings['size'])
+        )
+        save_plan(render_plan_path, render_plan)
+        for item in items:
+            screen_groups.setdefault(screen_map[item['image']], []).append(item)
 
-        try:
-            audio_clip = AudioFileClip(str(audio_path))
-            clip_duration = audio_clip.duration
-            total_combined_clip_duration_sec += clip_duration
+    stills_dir = output_dir / "_stills"
+    jobs = []
+    clips_by_still = {}
+    shared_ids = set()
+    for representative, group in screen_groups.items():
+        if len(group) < 2:
+            continue
+        still_path = stills_dir / f"{PROJECT_NAME}_still_{group[0]['id']}.mp4"
+        clips_by_still[still_path] = group
+        shared_ids.update(member['id'] for member in group)
+        jobs.append(dict(render_settings, kind='still', id=f"still_{group[0]['id']}", image=representative,
+                         uses=len(group), output=still_path,
+                         duration=max(member['duration'] for member in group)))
+    jobs += [dict(item, kind='clip') for item in items if item['id'] not in shared_ids]
+    if clips_by_still:
+        stills_dir.mkdir(parents=True, exist_ok=True)
+        reused = sum(len(group) for group in clips_by_still.values())
+        print(f"{reused} clips share {len(clips_by_still)} repeated screens; {len(jobs)} encodes instead of {len(items)}.")
 
-            print(f"  Clip Duration (from audio): {format_seconds_to_min_sec(clip_duration)}")
+    def clip_done(item, elapsed, worker):
+        nonlocal total_clips_generated, total_combined_clip_duration_sec
+        total_clips_generated += 1
+        total_combined_clip_duration_sec += item['duration']
+        print(f"Done! Clip {item['position']}/{item['total']} ({item['id']}) generated successfully. "
+              f"Time Taken: {format_seconds_to_min_sec(elapsed)} | Worker {worker}")
 
-            img = Image.open(image_path).convert("RGB")
-            img = ImageOps.exif_transpose(img)
-            img = img.resize(VIDEO_SIZE, Resampling.LANCZOS)
-            img_array = np.array(img)
-            
-            video_clip = ImageClip(img_array, duration=clip_duration)
-            final_video_clip = video_clip.with_audio(audio_clip)
+    def clip_failed(item, error):
+        print(f"Error generating clip for {item['image'].name} & {item['audio'].name}: {error}")
+        print("Skipping this pair...")
 
-            ### --- SECTION 3: UPDATED OUTPUT FILENAME LOGIC --- ###
-            # Use the simple logical_id (stem) for the output filename
-            output_clip_filename = f"{PROJECT_NAME}_clip_{logical_id}.mp4"
-            output_clip_path = CLIPS_OUTPUT_DIR / output_clip_filename
-
-            print(f"  Generating clip to: {output_clip_path}...")
-            final_video_clip.write_videofile(
-                str(output_clip_path),
-                fps=FPS,
-                codec='libx264',
-                audio_codec='aac',
-                logger=None
-            )
-            
-            actual_time_taken = time.time() - clip_start_time
-            print(f"Done! Clip generated successfully. Time Taken: {format_seconds_to_min_sec(actual_time_taken)}")
-            total_clips_generated += 1
+    def report(entry):
+        job = entry['job']
+        if job['kind'] == 'clip':
+            if entry['ok']:
+                clip_done(job, entry['elapsed'], entry['worker'])
+            else:
+                clip_failed(job, entry['error'])
+            return
 
-        except Exception as e:
-            print(f"Error generating clip for {image_path.name} & {audio_path.name}: {e}")
-            print("Skipping this pair...")
-        finally:
-            if 'audio_clip' in locals() and audio_clip:
-                audio_clip.close()
-            if 'video_clip' in locals() and video_clip:
-                video_clip.close()
-            if 'final_video_clip' in locals() and final_video_clip:
-                final_video_clip.close()
+        # A shared screen finished: mux each clip's own narration onto it
+        for item in clips_by_still[job['output']]:
+            if not entry['ok']:
+                clip_failed(item, f"shared screen failed to render ({entry['error']})")
+                continue
+            mux_start = time.time()
+            output_clip_path = output_dir / f"{PROJECT_NAME}_clip_{item['id']}.mp4"
+            try:
+                mux_narration(job['output'], item['audio'], item['duration'], output_clip_path)
+                clip_done(item, entry['elapsed'] + time.time() - mux_start, f"{entry['worker']} (shared screen)")
+            except Exception as e:
+                clip_failed(item, e)
+
+    if DISTRIBUTED_QUEUE_DIR:
+        pool = QueueCoordinator(Path(DISTRIBUTED_QUEUE_DIR), f"{PROJECT_NAME}-clips", local_workers=LOCAL_QUEUE_WORKERS)
+    else:
+        pool = AdaptiveWorkerPool(
+            min_workers=MIN_WORKERS,
+            max_workers=MAX_WORKERS,
+            memory_budget_mb=MEMORY_BUDGET_MB,
+            min_free_disk_mb=MIN_FREE_DISK_MB,
+            disk_path=output_dir
+        )
+    try:
+        pool.run(render_clip, jobs, on_result=report)
+    except Exception as e:
+        # e.g. the disk filled up or the shared queue directory became unreachable
+        print(f"\nClip generation stopped early: {e}")
+    finally:
+        shutil.rmtree(stills_dir, ignore_errors=True)
 
     print("\n----------------------------------------------------------")
     print("Individual Video Clip Generation Complete!")
     print(f"Total clips generated: {total_clips_generated}")
     print(f"Total combined length of all clips: {format_seconds_to_min_sec(total_combined_clip_duration_sec)}")
+    for line in pool.summary_lines():
+        print(line)
     print("----------------------------------------------------------")
 
 if __name__ == "__main__":
@@ -2,12 +2,6 @@ import os
 import re
 import time
 from pathlib import Path
-from moviepy.video.VideoClip import ImageClip
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-
-from PIL import Image, ImageOps
-from PIL.Image import Resampling
-import numpy as np
 
 # --- Configuration ---
 PROJECT_NAME = "coach-dashboard"
@@ -20,6 +14,12 @@ CLIPS_OUTPUT_DIR = Path("2-video_clip_gen/output_clips")
 VIDEO_SIZE = (1920, 1080)
 FPS = 24
 
+# Narration formats produced by stage 1. AAC (.m4a) audio is stream-copied into the clip;
+# anything else is encoded to AAC here.
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.wav')
+AUDIO_FORMAT = "mp3"   # Keep in step with AUDIO_FORMAT in stage 1; it wins when a stem has several formats
+STREAM_COPY_AUDIO_EXTENSIONS = ('.m4a',)
+
 # --- Helper Function for Time Formatting ---
 def format_seconds_to_min_sec(seconds: float) -> str:
     minutes = int(seconds // 60)
@@ -41,6 +41,29 @@ def natural_sort_key(file_path: Path) -> int:
         return int(match.group(1))
     return 0
 
+def build_audio_map(audio_files: list[Path]) -> dict[str, Path]:
+    """
+    Maps each stem to its narration file. A stem with files in several formats (left behind when
+    stage 1's AUDIO_FORMAT changed) uses the AUDIO_FORMAT file; without one it is ambiguous and skipped.
+    """
+    files_by_stem = {}
+    for path in audio_files:
+        files_by_stem.setdefault(path.stem, []).append(path)
+
+    audio_map = {}
+    for stem, paths in files_by_stem.items():
+        if len(paths) == 1:
+            audio_map[stem] = paths[0]
+            continue
+        names = ", ".join(sorted(p.name for p in paths))
+        preferred = [p for p in paths if p.suffix.lower() == f".{AUDIO_FORMAT}"]
+        if preferred:
+            audio_map[stem] = preferred[0]
+            print(f"  Note: several narration files for '{stem}' ({names}); using {preferred[0].name}.")
+        else:
+            print(f"  Warning: several narration files for '{stem}' ({names}) and none is .{AUDIO_FORMAT}; skipping it.")
+    return audio_map
+
 
 # --- Main Single Clip Generation Function ---
 def generate_single_clip():
@@ -67,13 +90,13 @@ def generate_single_clip():
         key=natural_sort_key
     )
     audio_files = sorted(
-        [f for f in AUDIO_INPUT_DIR.iterdir() if f.is_file() and f.suffix.lower() == '.mp3'],
+        [f for f in AUDIO_INPUT_DIR.iterdir() if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS],
         key=natural_sort_key
     )
 
     # 2. Map filename stems to full paths
     image_map = {p.stem: p for p in image_files}
-    audio_map = {p.stem: p for p in audio_files}
+    audio_map = build_audio_map(audio_files)
 
     # 3. Find common stems (logical IDs)
     common_stems = sorted(
@@ -115,6 +138,13 @@ def generate_single_clip():
             print("Error: Invalid input. Please enter a number.")
 
     # --- 3. Generate the Single Clip ---
+    # Media libraries are only imported once there is a clip to render
+    from moviepy.video.VideoClip import ImageClip
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from PIL import Image, ImageOps
+    from PIL.Image import Resampling
+    import numpy as np
+
     image_path = selected_pair['image']
     audio_path = selected_pair['audio']
     logical_id = selected_pair['id'] # Use the clean ID
@@ -133,7 +163,13 @@ def generate_single_clip():
         img_array = np.array(img)
         
         video_clip = ImageClip(img_array, duration=clip_duration)
-        final_video_clip = video_clip.with_audio(audio_clip)
+        if audio_path.suffix.lower() in STREAM_COPY_AUDIO_EXTENSIONS:
+            # Mux the AAC narration as-is instead of decoding and re-encoding it
+            final_video_clip = video_clip
+            audio_source = str(audio_path)
+        else:
+            final_video_clip = video_clip.with_audio(audio_clip)
+            audio_source = True
 
         # The output filename uses the new, clean logical ID
         output_clip_filename = f"{PROJECT_NAME}_clip_{logical_id}.mp4"
@@ -144,6 +180,7 @@ def generate_single_clip():
             str(output_clip_path),
             fps=FPS,
             codec='libx264',
+            audio=audio_source,
             audio_codec='aac',
             logger=None
         )
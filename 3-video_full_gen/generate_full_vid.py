@@ -1,15 +1,24 @@
-from moviepy.video.io.VideoFileClip import VideoFileClip
-from moviepy import concatenate_videoclips
-from moviepy import vfx
-
 from pathlib import Path
 import re
 import time
 import os
 import sys
+import json
+import shutil
+import math
+import queue
+import threading
 from contextlib import contextmanager
 import warnings # <--- To skip harmless warnings
 
+# Shared helpers live in utils/ at the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.render_pool import AdaptiveWorkerPool
+from utils.job_queue import QueueCoordinator
+from utils.ffmpeg_tools import run_ffmpeg
+from utils.render_plan import plan_path, load_plan, save_plan, cached_duration
+from utils.uploader import BackgroundUploader
+
 # THIS LINE HIDES THE HARMLESS FFMPEG WARNING
 warnings.filterwarnings("ignore", message=".*bytes wanted but 0 bytes read.*") 
 
@@ -31,6 +40,69 @@ FINAL_VIDEO_FILENAME = f"{PROJECT_NAME}_full_video.mp4"
 TRANSITION_DURATION = 0.75 
 FPS = 24
 
+# Stage 2 always writes AAC audio, and the fades only touch the picture, so the clips'
+# audio can be concatenated by stream copy instead of being decoded and re-encoded.
+AUDIO_STREAM_COPY = True
+
+# --- Output Renditions ---
+# Each segment is decoded and composited once and every frame is fanned out to one encoder per
+# rendition, so extra resolutions cost an encode each instead of a full render. The first
+# rendition is written to FINAL_VIDEO_FILENAME; the others get their label appended.
+RENDITIONS = [
+    {'label': '1080p', 'size': (1920, 1080)},
+    # {'label': '720p', 'size': (1280, 720)},
+    # {'label': '480p', 'size': (854, 480)},
+]
+
+# --- Lecture Sections ---
+# Optional JSON map of lecture names to inclusive, 1-based clip ranges, in lecture order, e.g.
+#   {"01 Welcome": [1, 4], "02 Setting Up": [5, 12]}
+# Segments are cut at every section boundary, so each lecture starts on a keyframe and is written
+# as its own mp4 by stream copy from the same render, next to the full video and a chapters file.
+SECTION_MAP_FILE = Path("3-video_full_gen") / f"{PROJECT_NAME}_sections.json"
+LECTURES_OUTPUT_DIR = FINAL_OUTPUT_DIR / "lectures"
+
+# --- Streaming Output ---
+# With STREAMING_OUTPUT on, every rendered segment is also published as soon as it and all segments
+# before it are done: its video (first rendition) and its slice of the narration are muxed by stream
+# copy into an MPEG-TS file, which is appended to a live HLS playlist (EVENT type, closed with
+# ENDLIST when the render finishes). Upload and playback can start while the rest still renders.
+# UPLOAD_DESTINATION (a directory or an http(s) URL accepting PUT) receives each file as it completes.
+# The final mp4s are written with their index at the front either way, so playback can start early.
+STREAMING_OUTPUT = False
+STREAMING_OUTPUT_DIR = FINAL_OUTPUT_DIR / "hls"
+STREAMING_PLAYLIST = f"{PROJECT_NAME}.m3u8"
+UPLOAD_DESTINATION = None
+
+# --- Preview Mode ---
+# Stitches the low-resolution clips stage 2 wrote in preview mode, with the same ordering and
+# transitions, using the fastest encoder settings. Clip durations are cached in the render plan by
+# each clip file's size and mtime, so clips that haven't changed aren't probed again.
+PREVIEW_MODE = False
+PREVIEW_FPS = 12
+PREVIEW_PRESET = 'ultrafast'
+PREVIEW_CLIPS_INPUT_DIR = CLIPS_INPUT_DIR / "preview"
+PREVIEW_VIDEO_FILENAME = f"{PROJECT_NAME}_preview.mp4"
+PREVIEW_RENDITIONS = [{'label': 'preview', 'size': None}]   # None keeps the size of the preview clips
+
+# --- Parallel Segment Rendering ---
+# Every clip fades from and to black on its own, so the timeline can be rendered as independent
+# runs of SEGMENT_CLIPS clips in worker processes and joined afterwards by stream copy.
+SEGMENT_CLIPS = 12
+ENCODER_PRESET = 'faster'
+ENCODER_THREADS = 4
+MIN_WORKERS = 1
+MAX_WORKERS = max(1, (os.cpu_count() or 2) // ENCODER_THREADS)
+MEMORY_BUDGET_MB = 8192   # Hard cap on the combined RSS of all segment workers and their ffmpeg writers
+MIN_FREE_DISK_MB = 4096
+
+# --- Distributed Rendering ---
+# Point this at a directory on shared storage (e.g. an NFS mount) to publish segment-encode jobs there
+# instead of rendering on this machine. Run the project from the shared mount and start workers
+# on each node from the project root with: python utils/render_worker.py <queue dir>
+DISTRIBUTED_QUEUE_DIR = None
+LOCAL_QUEUE_WORKERS = 0   # Queue workers to also start on this machine (handy for single-machine runs)
+
 # --- Helper Functions (unchanged) ---
 def format_seconds_to_min_sec(seconds: float) -> str:
     minutes = int(seconds // 60)
@@ -44,36 +116,243 @@ def format_seconds_to_min_sec(seconds: float) -> str:
 def natural_sort_key(s: str) -> list:
     return [float(c) if c.replace('.', '').isdigit() else c for c in re.split(r'(\d+(?:\d+)*)', s)]
 
+def write_concat_list(paths: list[Path], list_path: Path, durations: list[float] | None = None) -> Path:
+    """Writes an ffmpeg concat demuxer list, optionally pinning each entry's duration."""
+    lines = []
+    for i, path in enumerate(paths):
+        escaped = path.resolve().as_posix().replace("'", "'\\''")
+        lines.append(f"file '{escaped}'")
+        if durations is not None:
+            lines.append(f"duration {durations[i]:.6f}")
+    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return list_path
+
+def build_audio_track(clip_paths: list[Path], durations: list[float], output_path: Path, copy: bool = True) -> Path:
+    """
+    Joins the audio streams of the given clips into one AAC track, by stream copy unless `copy` is off.
+    Each clip's duration is pinned in the concat list so the track stays in sync
+    with the stitched picture.
+    """
+    list_path = write_concat_list(clip_paths, output_path.with_suffix(".concat.txt"), durations)
+    codec_args = ["-c", "copy"] if copy else ["-c:a", "aac", "-b:a", "192k"]
+    try:
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", str(list_path), "-map", "0:a", *codec_args, str(output_path)])
+    finally:
+        list_path.unlink(missing_ok=True)
+    return output_path
+
+def join_segments(segment_paths: list[Path], audio_path: Path, output_path: Path) -> Path:
+    """Concatenates the rendered video segments and muxes the audio track, all by stream copy."""
+    list_path = write_concat_list(segment_paths, output_path.with_suffix(".concat.txt"))
+    try:
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", str(list_path), "-i", str(audio_path),
+                    "-map", "0:v", "-map", "1:a", "-c", "copy", "-movflags", "+faststart", str(output_path)])
+    finally:
+        list_path.unlink(missing_ok=True)
+    return output_path
+
+def write_stream_segment(video_path: Path, clip_paths: list[Path], durations: list[float], offset: float,
+                         output_path: Path) -> Path:
+    """
+    Muxes one rendered segment and the audio of its clips into an MPEG-TS file by stream copy.
+    Timestamps start at `offset`, the segment's start on the full timeline, so the files play back to back.
+    """
+    list_path = write_concat_list(clip_paths, output_path.with_suffix(".concat.txt"), durations)
+    audio_args = ["-c:a", "copy"] if AUDIO_STREAM_COPY else ["-c:a", "aac", "-b:a", "192k"]
+    try:
+        run_ffmpeg(["-i", str(video_path), "-f", "concat", "-safe", "0", "-i", str(list_path),
+                    "-map", "0:v", "-map", "1:a", "-c:v", "copy", *audio_args, "-bsf:v", "h264_mp4toannexb",
+                    "-output_ts_offset", f"{offset:.6f}", "-muxdelay", "0", "-f", "mpegts", str(output_path)])
+    finally:
+        list_path.unlink(missing_ok=True)
+    return output_path
+
+def write_hls_playlist(entries: list[tuple[str, float]], target_duration: int, output_path: Path, ended: bool) -> Path:
+    """Rewrites the HLS event playlist for the (file name, duration) entries published so far."""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:EVENT",
+             f"#EXT-X-TARGETDURATION:{target_duration}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for name, duration in entries:
+        lines += [f"#EXTINF:{duration:.6f},", name]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    tmp_path = output_path.with_suffix(".tmp")
+    tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp_path.replace(output_path)   # Players polling the playlist never read a half-written file
+    return output_path
+
+def load_section_map(path: Path, num_clips: int) -> list[tuple[str, int, int]]:
+    """
+    Reads the lecture section map and returns (name, first, last) with 0-based clip indices.
+    Raises ValueError if ranges are malformed, overlap, run backwards or fall outside the clips.
+    """
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object of section name -> [first clip, last clip], got a {type(data).__name__}")
+    sections = []
+    previous_last = -1
+    for name, clip_range in data.items():
+        if not (isinstance(clip_range, list) and len(clip_range) == 2
+                and all(isinstance(n, int) and not isinstance(n, bool) for n in clip_range)):
+            raise ValueError(f"Section '{name}' must map to [first clip, last clip], got {clip_range!r}")
+        first, last = clip_range[0] - 1, clip_range[1] - 1
+        if not 0 <= first <= last < num_clips:
+            raise ValueError(f"Section '{name}' covers clips {clip_range[0]}-{clip_range[1]}, but there are {num_clips} clips")
+        if first <= previous_last:
+            raise ValueError(f"Section '{name}' overlaps or comes before the previous section")
+        sections.append((name, first, last))
+        previous_last = last
+    return sections
+
+def plan_segment_ranges(num_clips: int, sections: list[tuple[str, int, int]]) -> list[range]:
+    """Splits the clip list into runs of at most SEGMENT_CLIPS that never cross a section boundary."""
+    boundaries = {0, num_clips}
+    for _, first, last in sections:
+        boundaries.update((first, last + 1))
+    cuts = sorted(boundaries)
+    ranges = []
+    for start, stop in zip(cuts, cuts[1:]):
+        for segment_start in range(start, stop, SEGMENT_CLIPS):
+            ranges.append(range(segment_start, min(segment_start + SEGMENT_CLIPS, stop)))
+    return ranges
+
+def format_vtt_timestamp(seconds: float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{milliseconds:03d}"
+
+def write_chapters(chapters: list[tuple[str, float, float]], output_path: Path) -> Path:
+    """Writes (title, start, end) chapter markers as a WebVTT chapters sidecar."""
+    lines = ["WEBVTT", ""]
+    for i, (title, start, end) in enumerate(chapters):
+        lines += [str(i + 1), f"{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}", title, ""]
+    output_path.write_text("\n".join(lines), encoding="utf-8")
+    return output_path
+
+# --- Segment Rendering (runs inside a pool worker) ---
+def render_segment(job: dict) -> float:
+    """
+    Renders a run of consecutive clips, with their fades, to one video-only mp4 per rendition.
+    The timeline is composited once; each rendition has its own encoder thread that resizes the
+    shared frames and feeds its own ffmpeg process, so the encoders run in parallel.
+    Returns the duration of the written segment in seconds.
+    """
+    # moviepy is only imported once rendering starts; listing and planning don't need it
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+    from moviepy import concatenate_videoclips
+    from moviepy import vfx
+    from PIL import Image
+    from PIL.Image import Resampling
+    import numpy as np
+
+    loaded_clips = []
+    segment_video = None
+    try:
+        for clip_path, fade_in, fade_out in zip(job['clips'], job['fade_in'], job['fade_out']):
+            with suppress_stdout_stderr():
+                clip = VideoFileClip(clip_path, audio=False)
+
+            # Define the effects for this specific clip
+            effects_to_apply = []
+            if fade_in:
+                effects_to_apply.append(vfx.FadeIn(TRANSITION_DURATION))
+            if fade_out:
+                effects_to_apply.append(vfx.FadeOut(TRANSITION_DURATION))
+            
+            if effects_to_apply:
+                clip = clip.with_effects(effects_to_apply)
+            
+            loaded_clips.append(clip)
+
+        segment_video = concatenate_videoclips(loaded_clips, method="compose")
+
+        def encode(rendition, frames, errors):
+            size = tuple(rendition['size']) if rendition['size'] else tuple(segment_video.size)
+            writer = None
+            try:
+                writer = FFMPEG_VideoWriter(rendition['output'], size, job['fps'], codec='libx264',
+                                            preset=job['preset'], threads=ENCODER_THREADS)
+                while (frame := frames.get()) is not None:
+                    if errors:
+                        continue  # Another encoder failed; drain the queue so the decoder doesn't block
+                    if (frame.shape[1], frame.shape[0]) != size:
+                        frame = np.asarray(Image.fromarray(frame).resize(size, Resampling.BILINEAR))
+                    writer.write_frame(frame)
+            except Exception as e:
+                errors.append(f"{rendition['label']}: {e}")
+                while frames.get() is not None:
+                    pass
+            finally:
+                if writer:
+                    writer.close()
+
+        errors = []
+        frame_queues = [queue.Queue(maxsize=8) for _ in job['renditions']]
+        encoders = [threading.Thread(target=encode, args=(rendition, frames, errors))
+                    for rendition, frames in zip(job['renditions'], frame_queues)]
+        for encoder in encoders:
+            encoder.start()
+        frame_count = 0
+        try:
+            for frame in segment_video.iter_frames(fps=job['fps'], dtype="uint8"):
+                for frames in frame_queues:
+                    frames.put(frame)
+                frame_count += 1
+        finally:
+            for frames in frame_queues:
+                frames.put(None)
+            for encoder in encoders:
+                encoder.join()
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return frame_count / job['fps']
+    finally:
+        if segment_video:
+            segment_video.close()
+        for clip in loaded_clips:
+            clip.close()
+
 # --- Main Full Video Generation Function ---
 def generate_full_video():
     print("\n--- Stark Full Video Generator ---")
     print(f"Project: {PROJECT_NAME}")
+    if PREVIEW_MODE:
+        print(f"Mode: PREVIEW ({PREVIEW_FPS} fps, '{PREVIEW_PRESET}' preset)")
+    clips_input_dir = PREVIEW_CLIPS_INPUT_DIR if PREVIEW_MODE else CLIPS_INPUT_DIR
 
     # ... (File checking code is the same) ...
-    if not CLIPS_INPUT_DIR.exists():
-        print(f"Error: Input clips directory '{CLIPS_INPUT_DIR}' not found.")
+    if not clips_input_dir.exists():
+        print(f"Error: Input clips directory '{clips_input_dir}' not found.")
         return
 
-    clip_files = sorted([f for f in CLIPS_INPUT_DIR.iterdir() if f.is_file() and f.suffix.lower() == '.mp4'], 
+    clip_files = sorted([f for f in clips_input_dir.iterdir() if f.is_file() and f.suffix.lower() == '.mp4'], 
                         key=lambda p: natural_sort_key(p.name))
 
     if not clip_files:
-        print(f"No video clips found in '{CLIPS_INPUT_DIR}'.")
+        print(f"No video clips found in '{clips_input_dir}'.")
         return
 
+    # Durations are probed from the clips on disk, cached by each clip's size and mtime, so a clip
+    # that was re-rendered (or wasn't, after new audio) is never timed from audio it wasn't built from
+    render_plan_path = plan_path(CLIPS_INPUT_DIR, PROJECT_NAME)
+    render_plan = load_plan(render_plan_path)
+    duration_cache = render_plan.setdefault('durations', {})
+
     print(f"\nFound {len(clip_files)} clips to stitch together:")
     total_duration_raw_clips = 0.0
     valid_clip_files = []
+    clip_durations = []
 
     for i, clip_path in enumerate(clip_files):
         try:
-            with suppress_stdout_stderr():
-                with VideoFileClip(str(clip_path)) as temp_clip: 
-                    clip_duration = temp_clip.duration
+            clip_duration = cached_duration(duration_cache, clip_path)
             
             total_duration_raw_clips += clip_duration
             print(f"  {i+1}. {clip_path.name} ({format_seconds_to_min_sec(clip_duration)})")
             valid_clip_files.append(clip_path)
+            clip_durations.append(clip_duration)
         except Exception as e:
             print(f"  Warning: Could not read or process clip {clip_path.name} ({e}). Skipping.")
     
@@ -81,75 +360,226 @@ def generate_full_video():
         print("No valid clips could be loaded. Aborting.")
         return
 
+    save_plan(render_plan_path, render_plan)
     print(f"\nEstimated total duration of raw clips: {format_seconds_to_min_sec(total_duration_raw_clips)}")
 
+    sections = []
+    if SECTION_MAP_FILE.exists():
+        try:
+            sections = load_section_map(SECTION_MAP_FILE, len(valid_clip_files))
+        except ValueError as e:
+            print(f"Error in section map '{SECTION_MAP_FILE}': {e}")
+            return
+        print(f"\nLecture sections from '{SECTION_MAP_FILE}':")
+        for name, first, last in sections:
+            section_duration = sum(clip_durations[first:last + 1])
+            print(f"  {name}: clips {first + 1}-{last + 1} ({format_seconds_to_min_sec(section_duration)})")
+
     proceed = input("\nDoes the list of clips look good to proceed? (y/n): ").lower().strip()
     if proceed != 'y':
         print("Aborted by user.")
         return
 
-    loaded_moviepy_clips = []
-    final_video = None
+    FINAL_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    renditions = PREVIEW_RENDITIONS if PREVIEW_MODE else RENDITIONS
+    main_filename = PREVIEW_VIDEO_FILENAME if PREVIEW_MODE else FINAL_VIDEO_FILENAME
+    output_filepaths = [
+        FINAL_OUTPUT_DIR / (main_filename if i == 0 else f"{Path(main_filename).stem}_{rendition['label']}.mp4")
+        for i, rendition in enumerate(renditions)
+    ]
+    segments_dir = FINAL_OUTPUT_DIR / f"{PROJECT_NAME}_segments{'_preview' if PREVIEW_MODE else ''}"
+    audio_track_path = None
+    uploader = BackgroundUploader(UPLOAD_DESTINATION) if UPLOAD_DESTINATION and not PREVIEW_MODE else None
     try:
-        print("\nLoading clips and preparing transitions...")
+        print("\nPlanning segments and transitions...")
+        segments_dir.mkdir(parents=True, exist_ok=True)
         num_clips = len(valid_clip_files)
+        jobs = []
+        for indices in plan_segment_ranges(num_clips, sections):
+            jobs.append({
+                'index': len(jobs),
+                'clips': [str(valid_clip_files[i]) for i in indices],
+                'fade_in': [i > 0 for i in indices],
+                'fade_out': [i < num_clips - 1 for i in indices],
+                'first_clip': indices.start,
+                'fps': PREVIEW_FPS if PREVIEW_MODE else FPS,
+                'preset': PREVIEW_PRESET if PREVIEW_MODE else ENCODER_PRESET,
+                'renditions': [
+                    dict(rendition, output=str(segments_dir / f"segment_{len(jobs) + 1:04d}_{rendition['label']}.mp4"))
+                    for rendition in renditions
+                ],
+            })
 
-        for i, clip_path in enumerate(valid_clip_files):
-            with suppress_stdout_stderr():
-                clip = VideoFileClip(str(clip_path))
+        streaming = STREAMING_OUTPUT and not PREVIEW_MODE
+        stream_entries = []       # (file name, duration) of the published segments, in timeline order
+        finished_segments = {}    # Rendered durations of segments still waiting for an earlier one
+        stream_offset = 0.0
+        playlist_path = STREAMING_OUTPUT_DIR / STREAMING_PLAYLIST
+        if streaming:
+            shutil.rmtree(STREAMING_OUTPUT_DIR, ignore_errors=True)
+            STREAMING_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+            # Players read the target duration once, so it has to cover the longest segment up front
+            target_duration = math.ceil(max(
+                sum(clip_durations[job['first_clip']:job['first_clip'] + len(job['clips'])]) for job in jobs
+            )) + 1
+            write_hls_playlist(stream_entries, target_duration, playlist_path, ended=False)
+            print(f"Streaming playlist: {playlist_path}")
 
-            # Define the effects for this specific clip
-            effects_to_apply = []
-            if i > 0:
-                effects_to_apply.append(vfx.FadeIn(TRANSITION_DURATION))
-            if i < num_clips - 1:
-                effects_to_apply.append(vfx.FadeOut(TRANSITION_DURATION))
-            
-            if effects_to_apply:
-                clip = clip.with_effects(effects_to_apply)
-            
-            loaded_moviepy_clips.append(clip)
+        def publish_ready_segments():
+            nonlocal streaming, stream_offset
+            while streaming and len(stream_entries) in finished_segments:
+                job = jobs[len(stream_entries)]
+                duration = finished_segments.pop(len(stream_entries))
+                first, last = job['first_clip'], job['first_clip'] + len(job['clips']) - 1
+                segment_audio_durations = clip_durations[first:last + 1]
+                segment_audio_durations[-1] += duration - sum(segment_audio_durations)
+                stream_name = f"{PROJECT_NAME}_{len(stream_entries) + 1:04d}.ts"
+                try:
+                    write_stream_segment(Path(job['renditions'][0]['output']), valid_clip_files[first:last + 1],
+                                         segment_audio_durations, stream_offset, STREAMING_OUTPUT_DIR / stream_name)
+                except Exception as e:
+                    print(f"  Warning: streaming output stopped at segment {len(stream_entries) + 1} ({e}). "
+                          "The full video is still written at the end.")
+                    streaming = False
+                    return
+                stream_entries.append((stream_name, duration))
+                stream_offset += duration
+                write_hls_playlist(stream_entries, target_duration, playlist_path, ended=False)
+                if uploader:
+                    # Queued in order, so the playlist is never published before the segment it lists
+                    uploader.submit(STREAMING_OUTPUT_DIR / stream_name, f"hls/{stream_name}")
+                    uploader.submit(playlist_path, f"hls/{playlist_path.name}", snapshot=True)
+                print(f"  Streaming: {len(stream_entries)}/{len(jobs)} segments published "
+                      f"({format_seconds_to_min_sec(stream_offset)} playable)")
 
-        if not loaded_moviepy_clips:
-            print("No clips were successfully loaded for concatenation. Aborting.")
-            return
-
-        print(f"\nStitching {len(loaded_moviepy_clips)} clips...")
+        print(f"\nStitching {num_clips} clips in {len(jobs)} segments "
+              f"({', '.join(rendition['label'] for rendition in renditions)})...")
         start_time = time.time()
-        
-        final_video = concatenate_videoclips(loaded_moviepy_clips, method="compose")
-
-        FINAL_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        output_filepath = FINAL_OUTPUT_DIR / FINAL_VIDEO_FILENAME
-
-        print(f"Exporting final video to: {output_filepath}...")
-        final_video.write_videofile(
-            str(output_filepath), 
-            fps=FPS, 
-            codec='libx264',
-            audio_codec='aac',
-            preset='faster',
-            threads=8,
-            logger=None
+
+        def report(entry):
+            job = entry['job']
+            if entry['ok']:
+                print(f"  Segment {job['index'] + 1}/{len(jobs)} rendered "
+                      f"({format_seconds_to_min_sec(entry['elapsed'])}, worker {entry['worker']})")
+                if streaming:
+                    finished_segments[job['index']] = entry['result']
+                    publish_ready_segments()
+            else:
+                print(f"  Segment {job['index'] + 1}/{len(jobs)} failed: {entry['error']}")
+
+        if DISTRIBUTED_QUEUE_DIR:
+            pool = QueueCoordinator(Path(DISTRIBUTED_QUEUE_DIR), f"{PROJECT_NAME}-segments", local_workers=LOCAL_QUEUE_WORKERS)
+        else:
+            pool = AdaptiveWorkerPool(
+                min_workers=MIN_WORKERS,
+                max_workers=MAX_WORKERS,
+                memory_budget_mb=MEMORY_BUDGET_MB,
+                min_free_disk_mb=MIN_FREE_DISK_MB,
+                disk_path=FINAL_OUTPUT_DIR
+            )
+        results = pool.run(render_segment, jobs, on_result=report)
+        failed = [entry for entry in results if not entry['ok']]
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(jobs)} segments failed to render")
+
+        # Stretch or trim each segment's last clip in the audio list so the audio lines up with
+        # the segment video exactly (the encoder rounds every segment to whole frames).
+        audio_durations = list(clip_durations)
+        for entry in results:
+            job = entry['job']
+            last = job['first_clip'] + len(job['clips']) - 1
+            planned = sum(clip_durations[job['first_clip']:last + 1])
+            audio_durations[last] += entry['result'] - planned
+
+        print("Joining clip audio" + (" by stream copy..." if AUDIO_STREAM_COPY else "..."))
+        audio_track_path = build_audio_track(
+            valid_clip_files,
+            audio_durations,
+            FINAL_OUTPUT_DIR / f"{PROJECT_NAME}_audio_track.m4a",
+            copy=AUDIO_STREAM_COPY
         )
-        
+
+        for r, output_filepath in enumerate(output_filepaths):
+            print(f"Exporting final video to: {output_filepath}...")
+            join_segments([Path(job['renditions'][r]['output']) for job in jobs], audio_track_path, output_filepath)
+        final_duration = sum(entry['result'] for entry in results)
+        if streaming:
+            write_hls_playlist(stream_entries, target_duration, playlist_path, ended=True)
+        if uploader:
+            if streaming:
+                uploader.submit(playlist_path, f"hls/{playlist_path.name}", snapshot=True)
+            for output_filepath in output_filepaths:
+                uploader.submit(output_filepath)
+
+        lecture_paths = []
+        if sections:
+            # Segment start times on the full timeline; section boundaries always fall on a segment start
+            segment_starts = {}
+            elapsed = 0.0
+            for entry in results:
+                segment_starts[entry['job']['first_clip']] = elapsed
+                elapsed += entry['result']
+            chapters = []
+            for name, first, last in sections:
+                following = [start for clip, start in segment_starts.items() if clip > last]
+                chapters.append((name, segment_starts[first], min(following, default=final_duration)))
+            chapters_path = write_chapters(chapters, FINAL_OUTPUT_DIR / f"{output_filepaths[0].stem}_chapters.vtt")
+            print(f"Chapter markers written to: {chapters_path}")
+            if uploader:
+                uploader.submit(chapters_path)
+
+            if not PREVIEW_MODE:
+                LECTURES_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+                for number, (name, first, last) in enumerate(sections, start=1):
+                    safe_name = re.sub(r'[\\/:*?"<>|]+', '-', name).strip()
+                    lecture_path = LECTURES_OUTPUT_DIR / f"{PROJECT_NAME}_lecture_{number:02d}_{safe_name}.mp4"
+                    lecture_audio_path = FINAL_OUTPUT_DIR / f"{PROJECT_NAME}_lecture_audio.m4a"
+                    try:
+                        build_audio_track(valid_clip_files[first:last + 1], audio_durations[first:last + 1],
+                                          lecture_audio_path, copy=AUDIO_STREAM_COPY)
+                        lecture_segments = [Path(job['renditions'][0]['output']) for job in jobs
+                                            if first <= job['first_clip'] <= last]
+                        print(f"Cutting lecture {number}: {lecture_path.name}...")
+                        join_segments(lecture_segments, lecture_audio_path, lecture_path)
+                        lecture_paths.append(lecture_path)
+                        if uploader:
+                            uploader.submit(lecture_path, f"lectures/{lecture_path.name}")
+                    finally:
+                        lecture_audio_path.unlink(missing_ok=True)
+
+        if uploader:
+            print("Waiting for uploads to finish...")
+            uploader.close()
+
         end_time = time.time()
         time_taken = end_time - start_time
 
         print("\n----------------------------------------------------------")
         print("Full Video Generation Complete!")
-        print(f"Output Video Location: {output_filepath}")
+        for rendition, output_filepath in zip(renditions, output_filepaths):
+            print(f"Output Video Location ({rendition['label']}): {output_filepath}")
         print(f"Time Taken: {format_seconds_to_min_sec(time_taken)}")
-        print(f"Final Video Duration: {format_seconds_to_min_sec(final_video.duration)}")
+        print(f"Final Video Duration: {format_seconds_to_min_sec(final_duration)}")
+        if lecture_paths:
+            print(f"Lecture Files: {len(lecture_paths)} in {LECTURES_OUTPUT_DIR}")
+        if streaming:
+            print(f"Streaming Playlist: {playlist_path} ({len(stream_entries)} segments)")
+        if uploader:
+            print(f"Uploaded to {UPLOAD_DESTINATION}: {uploader.uploaded} files, {len(uploader.errors)} failed")
+            for error in uploader.errors:
+                print(f"  Upload failed: {error}")
+        for line in pool.summary_lines():
+            print(line)
         print("----------------------------------------------------------")
 
     except Exception as e:
         print(f"\nAn unexpected error occurred during video stitching or export: {e}")
     finally:
-        if final_video:
-            final_video.close()
-        for clip in loaded_moviepy_clips:
-            clip.close()
+        if uploader:
+            uploader.close()
+        if audio_track_path:
+            audio_track_path.unlink(missing_ok=True)
+        shutil.rmtree(segments_dir, ignore_errors=True)
 
 if __name__ == "__main__":
     generate_full_video()
\ No newline at end of file
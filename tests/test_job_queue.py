@@ -0,0 +1,70 @@
+import os
+import sys
+import json
+import threading
+from pathlib import Path
+
+# Shared helpers live in utils/ at the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.job_queue import JobQueue, QueueCoordinator
+
+# Run from the project root: python -m pytest -q tests
+# Handlers are module-level so the local render workers can load them from this file.
+
+def square(job: dict) -> int:
+    return job["n"] * job["n"]
+
+def die_on_first_attempt(job: dict) -> int:
+    """Kills the worker process mid-job the first time, like an OOM kill."""
+    marker = Path(job["marker"])
+    if not marker.exists():
+        marker.touch()
+        os._exit(1)
+    return job["n"]
+
+def run_with_timeout(coordinator: QueueCoordinator, func, jobs: list, timeout: float = 60) -> list[dict]:
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(results=coordinator.run(func, jobs)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "coordinator did not finish"
+    return outcome["results"]
+
+def test_local_workers_finish_every_job(tmp_path):
+    coordinator = QueueCoordinator(tmp_path, "squares", local_workers=2, poll_interval=0.1)
+    results = run_with_timeout(coordinator, square, [{"n": n} for n in range(6)])
+
+    assert [entry["result"] for entry in results] == [n * n for n in range(6)]
+    assert all(entry["ok"] for entry in results)
+    assert list(tmp_path.glob("squares-*")) == []   # The run directory is withdrawn afterwards
+
+def test_job_of_a_dead_worker_is_requeued_and_finished(tmp_path):
+    # The lease outlasts the time an idle worker used to wait before exiting
+    coordinator = QueueCoordinator(tmp_path / "queue", "crash", local_workers=2, lease_seconds=12, poll_interval=0.1)
+    jobs = [{"n": 7, "marker": str(tmp_path / "crashed")}, {"n": 8, "marker": str(tmp_path / "crashed")}]
+    results = run_with_timeout(coordinator, die_on_first_attempt, jobs)
+
+    assert [entry["result"] for entry in results] == [7, 8]
+    assert coordinator.requeued_jobs == 1
+
+def test_requeue_moves_an_expired_claim_back_to_pending(tmp_path):
+    job_queue = JobQueue(tmp_path / "run")
+    job_queue.publish("00000", "handler.py:run", {"n": 1})
+    record = job_queue.claim()
+    os.utime(job_queue.claimed_dir / "00000.json", (0, 0))   # Lease long expired
+
+    assert job_queue.requeue_expired(lease_seconds=10) == ["00000"]
+    assert list(job_queue.claimed_dir.iterdir()) == []
+    requeued = json.loads((job_queue.pending_dir / "00000.json").read_text(encoding="utf-8"))
+    assert requeued["attempts"] == record["attempts"] + 1
+
+def test_results_from_an_earlier_run_are_not_accepted(tmp_path):
+    stale_run = JobQueue(tmp_path / "squares-0123456789ab")
+    stale_run.complete("00000", {"ok": True, "result": -1, "error": None, "worker": "old"})
+
+    coordinator = QueueCoordinator(tmp_path, "squares", local_workers=1, poll_interval=0.1)
+    results = run_with_timeout(coordinator, square, [{"n": 3}])
+
+    assert results[0]["result"] == 9
+    assert not stale_run.path.exists()
+    assert stale_run.complete("00001", {"ok": True}) is False   # A late write from the old run is discarded
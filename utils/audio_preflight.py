@@ -0,0 +1,172 @@
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Allow `python utils/audio_preflight.py ...` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.render_plan import file_signature
+from utils.script_corpus import scan_scripts
+
+# Audio quality pre-flight for the narration stage 2 picks up.
+# Every file is decoded once into a numpy array and measured in a few vectorized passes: silence
+# ratio and longest dead air, clipped samples, sudden loudness shifts (e.g. at the seam between two
+# TTS chunks generated at different levels) and the duration against the script's word count.
+# Measurements are cached by file size and mtime; the thresholds below are applied on every run,
+# so they can be tuned without decoding anything again.
+# Usage (from the project root): python utils/audio_preflight.py <audio dir> [--scripts selected_scripts]
+
+# --- Thresholds ---
+WINDOW_SEC = 0.02                 # Analysis window for silence detection
+SILENCE_THRESHOLD_DBFS = -45.0    # Windows quieter than this count as silence
+MAX_SILENCE_RATIO = 0.35          # Share of the file that may be silent
+MAX_DEAD_AIR_SEC = 4.0            # Longest single silence allowed
+CLIP_LEVEL = 0.99                 # Fraction of full scale at which a sample counts as clipped
+MAX_CLIPPED_FRACTION = 0.0005     # Share of clipped samples allowed
+LEVEL_BLOCK_SEC = 3.0             # Speech loudness is compared between adjacent blocks of this length
+MAX_LEVEL_JUMP_DB = 9.0           # Largest loudness change allowed between adjacent blocks
+WORDS_PER_SECOND = 2.5            # Same speaking-rate estimate the synthesizers use
+DURATION_RATIO_RANGE = (0.6, 1.7) # Allowed actual/expected duration ratio when the script is known
+
+# --- Measurement ---
+def measure_samples(samples, frame_rate: int) -> dict:
+    """
+    Measures decoded audio. `samples` is a float array scaled to [-1, 1], shaped (frames, channels).
+    """
+    import numpy as np
+
+    duration = len(samples) / frame_rate
+    peak = np.abs(samples).max(axis=1) if len(samples) else np.zeros(0, dtype=np.float32)
+    clipped_fraction = float(np.mean(peak >= CLIP_LEVEL)) if len(peak) else 0.0
+
+    mono = samples.mean(axis=1)
+    window = max(1, int(frame_rate * WINDOW_SEC))
+    num_windows = len(mono) // window
+    if num_windows == 0:
+        return {"duration": duration, "silence_ratio": 1.0, "longest_silence": duration,
+                "clipped_fraction": clipped_fraction, "max_level_jump_db": 0.0}
+
+    frames = mono[:num_windows * window].reshape(num_windows, window)
+    level_db = 20 * np.log10(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10)
+    silent = level_db < SILENCE_THRESHOLD_DBFS
+
+    # Longest run of silent windows, from the run-length encoding of the silence mask
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    longest_silence = float(run_lengths.max()) * WINDOW_SEC if len(run_lengths) else 0.0
+
+    # Mean speech level per block (silent windows excluded); blocks that are mostly silence are skipped
+    per_block = max(1, int(LEVEL_BLOCK_SEC / WINDOW_SEC))
+    num_blocks = num_windows // per_block
+    max_jump = 0.0
+    if num_blocks > 1:
+        block_db = level_db[:num_blocks * per_block].reshape(num_blocks, per_block)
+        speech = ~silent[:num_blocks * per_block].reshape(num_blocks, per_block)
+        speech_count = speech.sum(axis=1)
+        block_level = np.where(speech, block_db, 0.0).sum(axis=1) / np.maximum(speech_count, 1)
+        block_level[speech_count < per_block // 4] = np.nan
+        jumps = np.abs(np.diff(block_level))
+        if np.any(np.isfinite(jumps)):
+            max_jump = float(np.nanmax(jumps))
+
+    return {
+        "duration": duration,
+        "silence_ratio": float(silent.mean()),
+        "longest_silence": longest_silence,
+        "clipped_fraction": clipped_fraction,
+        "max_level_jump_db": max_jump,
+    }
+
+def measure_file(path: str) -> dict:
+    """Decodes one audio file and measures it. Runs in a worker process."""
+    from pydub import AudioSegment
+    import numpy as np
+
+    audio = AudioSegment.from_file(path)
+    full_scale = float(1 << (8 * audio.sample_width - 1))
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32).reshape(-1, audio.channels) / full_scale
+    return measure_samples(samples, audio.frame_rate)
+
+# --- Checks ---
+def find_problems(metrics: dict, expected_words: int | None = None) -> list[str]:
+    """Applies the thresholds to a file's measurements and returns a description of each failure."""
+    problems = []
+    if metrics["silence_ratio"] > MAX_SILENCE_RATIO:
+        problems.append(f"{metrics['silence_ratio']:.0%} silence")
+    if metrics["longest_silence"] > MAX_DEAD_AIR_SEC:
+        problems.append(f"{metrics['longest_silence']:.1f} s of dead air")
+    if metrics["clipped_fraction"] > MAX_CLIPPED_FRACTION:
+        problems.append(f"{metrics['clipped_fraction']:.2%} of samples clipped")
+    if metrics["max_level_jump_db"] > MAX_LEVEL_JUMP_DB:
+        problems.append(f"level jumps by {metrics['max_level_jump_db']:.1f} dB")
+    if expected_words:
+        expected = expected_words / WORDS_PER_SECOND
+        ratio = metrics["duration"] / expected
+        if not DURATION_RATIO_RANGE[0] <= ratio <= DURATION_RATIO_RANGE[1]:
+            problems.append(f"{metrics['duration']:.0f} s long, expected about {expected:.0f} s for {expected_words} words")
+    return problems
+
+def run_preflight(audio_paths: list[Path], scripts_dir: Path | None = None, cache: dict | None = None,
+                  max_workers: int | None = None) -> dict[Path, list[str]]:
+    """
+    Checks every file and maps each path to its list of problems (empty when it passed).
+    Files whose size and mtime match an entry in `cache` are not decoded again; `cache` is a dict
+    stored in the render plan and updated in place.
+    """
+    cache = {} if cache is None else cache
+    metrics = {}
+    errors = {}
+    to_measure = []
+    for path in audio_paths:
+        entry = cache.get(Path(path).as_posix())
+        if entry and entry.get("signature") == file_signature(path):
+            metrics[path] = entry["metrics"]
+        else:
+            to_measure.append(path)
+
+    if to_measure:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {path: executor.submit(measure_file, str(path)) for path in to_measure}
+            for path, future in futures.items():
+                try:
+                    metrics[path] = future.result()
+                    cache[Path(path).as_posix()] = {"signature": file_signature(path), "metrics": metrics[path]}
+                except Exception as e:
+                    errors[path] = str(e)
+
+    # Word counts of the scripts each file was synthesized from (same stem), from the script corpus cache
+    corpus = scan_scripts([Path(scripts_dir)], recursive=False)["scripts"] if scripts_dir else {}
+    results = {}
+    for path in audio_paths:
+        if path in errors:
+            results[path] = [f"could not be decoded ({errors[path]})"]
+        else:
+            script = corpus.get((Path(scripts_dir) / f"{Path(path).stem}.txt").as_posix(), {}) if scripts_dir else {}
+            results[path] = find_problems(metrics[path], script.get("words"))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Stark audio pre-flight: checks narration before rendering.")
+    parser.add_argument("audio_dir", type=Path, help="Directory of narration files (e.g. 1-audio_gen/output_audio/<project>)")
+    parser.add_argument("--scripts", type=Path, default=Path("selected_scripts"),
+                        help="Script directory used for the duration check (default: selected_scripts)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    audio_paths = sorted(p for p in args.audio_dir.iterdir() if p.suffix.lower() in ('.mp3', '.m4a', '.wav'))
+    print(f"\n--- Stark Audio Pre-flight: {args.audio_dir} ---")
+    if not audio_paths:
+        print("No audio files found.")
+        return True
+
+    results = run_preflight(audio_paths, args.scripts if args.scripts.exists() else None, max_workers=args.workers)
+    failed = 0
+    for path, problems in results.items():
+        print(f"{path.name} --> {'; '.join(problems) if problems else 'OK'}")
+        failed += bool(problems)
+    print("----------------------------------------------------------")
+    print(f"{len(audio_paths) - failed} passed, {failed} failed.")
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
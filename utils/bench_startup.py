@@ -0,0 +1,84 @@
+import sys
+import json
+import statistics
+import subprocess
+from pathlib import Path
+
+# Startup-time regression guard for the stage scripts.
+# Each script is loaded (module-level code only, main() is not called) in a fresh interpreter,
+# timed, and checked for heavy media/API libraries that should only load once real work starts.
+# Run from the project root: python utils/bench_startup.py
+# Exits with status 1 if any script regresses, so it can gate automation.
+
+STAGE_SCRIPTS = [
+    "1-audio_gen/synthesize_batch.py",
+    "1-audio_gen/synthesize_single.py",
+    "2-video_clip_gen/generate_clips_batch.py",
+    "2-video_clip_gen/generate_clips_single.py",
+    "3-video_full_gen/generate_full_vid.py",
+    "utils/calc_script_time.py",
+]
+HEAVY_MODULES = ["moviepy", "numpy", "PIL", "pydub", "openai", "imageio"]
+STARTUP_BUDGET_SECONDS = 0.35   # Per-script import budget, on top of bare interpreter startup
+RUNS = 5
+
+_PROBE = """
+import sys, json, time, importlib.util
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("bench_target", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in json.loads(sys.argv[2]) if name in sys.modules)
+print(json.dumps({"elapsed": elapsed, "heavy": heavy}))
+"""
+
+def measure_script(script_path: str) -> dict:
+    timings = []
+    heavy = []
+    for _ in range(RUNS):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE, script_path, json.dumps(HEAVY_MODULES)],
+            capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            return {"error": error[-1] if error else f"exit code {completed.returncode}"}
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings.append(result["elapsed"])
+        heavy = result["heavy"]
+    return {"median": statistics.median(timings), "heavy": heavy}
+
+def run_startup_benchmark() -> bool:
+    print("\n--- Stark Startup-Time Benchmark ---")
+    print(f"Budget: {STARTUP_BUDGET_SECONDS * 1000:.0f} ms per script | Runs: {RUNS}")
+    print("----------------------------------------------------------")
+
+    all_ok = True
+    for script_path in STAGE_SCRIPTS:
+        if not Path(script_path).exists():
+            print(f"{script_path} --> not found (run from the project root)")
+            all_ok = False
+            continue
+
+        result = measure_script(script_path)
+        if "error" in result:
+            print(f"{script_path} --> FAILED to load: {result['error']}")
+            all_ok = False
+            continue
+
+        problems = []
+        if result["median"] > STARTUP_BUDGET_SECONDS:
+            problems.append("over budget")
+        if result["heavy"]:
+            problems.append(f"imports {', '.join(result['heavy'])} at startup")
+        status = "OK" if not problems else "REGRESSION: " + "; ".join(problems)
+        print(f"{script_path} --> {result['median'] * 1000:.0f} ms --> {status}")
+        all_ok = all_ok and not problems
+
+    print("----------------------------------------------------------")
+    print("All scripts within budget." if all_ok else "Startup regression detected.")
+    return all_ok
+
+if __name__ == "__main__":
+    sys.exit(0 if run_startup_benchmark() else 1)
@@ -1,8 +1,14 @@
 import os
+import sys
+from pathlib import Path
 
-# Define the path to your _selected_scripts folder relative to the project root
+# Allow `python utils/calc_script_time.py` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.script_corpus import scan_scripts, format_seconds_to_min_sec
+
+# Define the path to your selected_scripts folder relative to the project root
 # Assuming utils/calc_script_time.py is run from the project root
-SCRIPTS_DIR = '_selected_scripts'
+SCRIPTS_DIR = 'selected_scripts'
 
 # Average speaking rate: 150 words per minute, which is 2.5 words per second
 WORDS_PER_SECOND = 2.5
@@ -10,14 +16,14 @@ WORDS_PER_SECOND = 2.5
 def calculate_script_times():
     """
     Calculates estimated audio length for each script file and a total.
+    Counts come from the script corpus cache, so only new or edited scripts are read.
     """
     if not os.path.exists(SCRIPTS_DIR):
         print(f"Error: Script directory '{SCRIPTS_DIR}' not found. Please ensure the path is correct.")
         return
 
-    script_files = sorted([f for f in os.listdir(SCRIPTS_DIR) if f.endswith('.txt')])
-
-    if not script_files:
+    report = scan_scripts([Path(SCRIPTS_DIR)], recursive=False)
+    if not report["scripts"]:
         print(f"No .txt script files found in '{SCRIPTS_DIR}'.")
         return
 
@@ -26,44 +32,24 @@ def calculate_script_times():
 
     print(f"\n--- Estimating Audio Lengths for Scripts in '{SCRIPTS_DIR}' ---")
 
-    for filename in script_files:
-        filepath = os.path.join(SCRIPTS_DIR, filename)
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-                words = len(content.split())
-                
-                estimated_seconds = words / WORDS_PER_SECOND
-                
-                minutes = int(estimated_seconds // 60)
-                seconds = int(estimated_seconds % 60)
-
-                total_words += words
-
-                time_str = ""
-                if minutes > 0:
-                    time_str += f"{minutes} min "
-                time_str += f"{seconds} sec"
-
-                report_lines.append(f"{filename} --> {words} words --> {time_str}")
+    for script_path, stats in report["scripts"].items():
+        filename = Path(script_path).relative_to(SCRIPTS_DIR).as_posix()
+        if "error" in stats:
+            report_lines.append(f"Error processing {filename}: {stats['error']}")
+            continue
 
-        except Exception as e:
-            report_lines.append(f"Error processing {filename}: {e}")
+        words = stats["words"]
+        total_words += words
+        time_str = format_seconds_to_min_sec(words / WORDS_PER_SECOND)
+        report_lines.append(f"{filename} --> {words} words --> {time_str}")
 
     print("\n".join(report_lines))
     print("----------------------------------------------------------")
-    
-    total_estimated_seconds = total_words / WORDS_PER_SECOND
-    total_minutes = int(total_estimated_seconds // 60)
-    total_seconds = int(total_estimated_seconds % 60)
 
-    total_time_str = ""
-    if total_minutes > 0:
-        total_time_str += f"{total_minutes} min "
-    total_time_str += f"{total_seconds} sec"
+    total_time_str = format_seconds_to_min_sec(total_words / WORDS_PER_SECOND)
 
     print(f"Total --> {total_words} words --> {total_time_str}")
     print("----------------------------------------------------------")
 
 if __name__ == "__main__":
-    calculate_script_times()
\ No newline at end of file
+    calculate_script_times()
@@ -0,0 +1,41 @@
+import os
+import re
+import subprocess
+from pathlib import Path
+
+# Thin wrappers around the ffmpeg binary. Planning and listing code uses these instead of moviepy,
+# which pulls in numpy, PIL and imageio on import.
+
+_DURATION_PATTERN = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+def ffmpeg_binary() -> str:
+    """Resolves ffmpeg the same way moviepy does: FFMPEG_BINARY, then imageio-ffmpeg's bundled binary."""
+    configured = os.getenv("FFMPEG_BINARY", "ffmpeg-imageio")
+    if configured != "ffmpeg-imageio":
+        return configured
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return "ffmpeg"
+
+def run_ffmpeg(args: list[str]):
+    try:
+        subprocess.run(
+            [ffmpeg_binary(), "-y", "-loglevel", "error", *args],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg failed: {e.stderr.decode(errors='replace').strip()}") from e
+
+def probe_duration(path: Path) -> float:
+    """Reads a media file's duration in seconds from ffmpeg's header dump, without decoding it."""
+    completed = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-i", str(path)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    match = _DURATION_PATTERN.search(completed.stderr.decode(errors="replace"))
+    if not match:
+        raise RuntimeError(f"Could not read the duration of '{path}'")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
@@ -0,0 +1,255 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import inspect
+import subprocess
+import uuid
+from pathlib import Path
+
+# --- Queue Settings ---
+LEASE_SECONDS = 120      # A claimed job whose lease isn't renewed for this long is put back in the queue
+MAX_ATTEMPTS = 3         # Give up on a job after this many expired leases
+POLL_INTERVAL = 2.0      # Seconds between coordinator/worker polls of the shared directory
+RUN_NONCE_LENGTH = 12    # Hex digits of the random suffix that makes every run directory unique
+
+# Queue layout (one directory per run, named <run name>-<nonce>, on storage every node can see):
+#   pending/<job_id>.json  published jobs waiting for a worker
+#   claimed/<job_id>.json  jobs a worker has claimed; the file's mtime is the lease heartbeat
+#   done/<job_id>.json     results written back by workers
+# Claims are atomic renames from pending/ to claimed/, which NFS performs on the server, so two
+# workers can never claim the same job. No broker or database is needed.
+
+def _write_json_atomic(path: Path, data: dict):
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(data, indent=2, default=str), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def handler_spec(func) -> str:
+    """
+    Describes a module-level function as '<script path>:<name>' so workers on other nodes can load it.
+    The path is relative to the project root whenever possible, since every node runs from there.
+    """
+    path = Path(inspect.getfile(func)).resolve()
+    try:
+        path = path.relative_to(Path.cwd().resolve())
+    except ValueError:
+        pass
+    return f"{path.as_posix()}:{func.__name__}"
+
+class JobQueue:
+    """A directory-backed job queue with leases, safe to share between machines over NFS."""
+
+    def __init__(self, path: Path, create: bool = True):
+        self.path = Path(path)
+        self.pending_dir = self.path / "pending"
+        self.claimed_dir = self.path / "claimed"
+        self.done_dir = self.path / "done"
+        if create:
+            for directory in (self.pending_dir, self.claimed_dir, self.done_dir):
+                directory.mkdir(parents=True, exist_ok=True)
+
+    def shared_now(self) -> float:
+        """
+        Current time according to the shared filesystem. Lease ages are measured against this
+        instead of the local clock so clock skew between nodes can't expire a healthy lease.
+        """
+        clock_path = self.path / f".clock-{socket.gethostname()}"
+        clock_path.touch()
+        os.utime(clock_path)
+        return clock_path.stat().st_mtime
+
+    # --- Coordinator Side ---
+    def publish(self, job_id: str, handler: str, payload: dict):
+        _write_json_atomic(self.pending_dir / f"{job_id}.json",
+                           {"id": job_id, "handler": handler, "payload": payload, "attempts": 0})
+
+    def requeue_expired(self, lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS) -> list[str]:
+        """Moves jobs with stale leases back to pending, or fails them after `max_attempts` tries."""
+        now = self.shared_now()
+        requeued = []
+        for claimed_path in self.claimed_dir.glob("*.json"):
+            try:
+                if now - claimed_path.stat().st_mtime < lease_seconds:
+                    continue
+                # Take the claim out of claimed/ before republishing it, so a worker that claims the
+                # republished job can't have its fresh claim removed by this requeue
+                expired_path = self.claimed_dir / f".{claimed_path.stem}.{uuid.uuid4().hex}.expired"
+                os.rename(claimed_path, expired_path)
+            except FileNotFoundError:
+                continue  # Completed while we were looking
+            if now - expired_path.stat().st_mtime < lease_seconds:
+                os.rename(expired_path, claimed_path)   # Heartbeat arrived just before the rename
+                continue
+            record = _read_json(expired_path)
+            if record is None:
+                expired_path.unlink(missing_ok=True)
+                continue
+            job_id = record["id"]
+            if (self.done_dir / f"{job_id}.json").exists():
+                expired_path.unlink(missing_ok=True)
+                continue
+            record["attempts"] = record.get("attempts", 0) + 1
+            if record["attempts"] >= max_attempts:
+                _write_json_atomic(self.done_dir / f"{job_id}.json", {
+                    "id": job_id, "ok": False, "result": None, "worker": None, "elapsed": 0.0, "peak_rss_mb": 0.0,
+                    "error": f"lease expired {record['attempts']} times without a result",
+                })
+            else:
+                _write_json_atomic(self.pending_dir / f"{job_id}.json", record)
+                requeued.append(job_id)
+            expired_path.unlink(missing_ok=True)
+        return requeued
+
+    def finished_ids(self) -> set[str]:
+        return {p.stem for p in self.done_dir.glob("*.json")}
+
+    def result(self, job_id: str) -> dict | None:
+        return _read_json(self.done_dir / f"{job_id}.json")
+
+    # --- Worker Side ---
+    def claim(self) -> dict | None:
+        """Claims the oldest pending job, or returns None when there is nothing to do."""
+        for pending_path in sorted(self.pending_dir.glob("*.json")):
+            claimed_path = self.claimed_dir / pending_path.name
+            try:
+                # Refresh the mtime first: rename keeps it, and it becomes the lease start
+                os.utime(pending_path)
+                os.rename(pending_path, claimed_path)
+            except FileNotFoundError:
+                continue  # Another worker got there first
+            record = _read_json(claimed_path)
+            if record is None or (self.done_dir / pending_path.name).exists():
+                claimed_path.unlink(missing_ok=True)
+                continue
+            return record
+        return None
+
+    def heartbeat(self, job_id: str) -> bool:
+        """Renews the lease. Returns False if the lease was lost (the job was requeued)."""
+        try:
+            os.utime(self.claimed_dir / f"{job_id}.json")
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, job_id: str, result: dict) -> bool:
+        """Writes the result back. Returns False if the run was withdrawn (its directory is gone)."""
+        try:
+            _write_json_atomic(self.done_dir / f"{job_id}.json", dict(result, id=job_id))
+        except FileNotFoundError:
+            return False
+        (self.claimed_dir / f"{job_id}.json").unlink(missing_ok=True)
+        return True
+
+# --- Coordinator ---
+class QueueCoordinator:
+    """
+    Publishes jobs to a shared-directory queue and waits for workers on any node to finish them.
+    Has the same run()/summary_lines() interface as AdaptiveWorkerPool, so a stage can use either.
+    """
+
+    def __init__(self, queue_root: Path, run_name: str, local_workers: int = 0,
+                 lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS,
+                 poll_interval: float = POLL_INTERVAL):
+        self.queue_root = Path(queue_root)
+        self.run_name = run_name
+        self.local_workers = local_workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.worker_stats = {}   # worker name -> {"jobs", "peak"}
+        self.requeued_jobs = 0
+
+    def _start_local_worker(self) -> subprocess.Popen:
+        # Local workers run until the coordinator stops them; one that dies (e.g. OOM-killed
+        # mid-job) is replaced, so its requeued job still has a worker to go to
+        worker_script = Path(__file__).resolve().parent / "render_worker.py"
+        return subprocess.Popen([sys.executable, str(worker_script), str(self.queue_root),
+                                 "--lease-seconds", str(self.lease_seconds),
+                                 "--poll-interval", str(self.poll_interval)])
+
+    def run(self, func, jobs: list, on_result=None) -> list[dict]:
+        """
+        Publishes `func(job)` for every job and blocks until all of them have a result.
+        Returns one result dict per job, in job order, shaped like AdaptiveWorkerPool.run().
+        """
+        # Withdraw what an earlier, aborted run of the same name left behind. Each run gets a fresh
+        # directory, so a worker still busy with an old job can't write a result into this one.
+        self.queue_root.mkdir(parents=True, exist_ok=True)
+        for stale_dir in self.queue_root.glob(f"{self.run_name}-*"):
+            if re.fullmatch(rf"{re.escape(self.run_name)}-[0-9a-f]{{{RUN_NONCE_LENGTH}}}", stale_dir.name):
+                shutil.rmtree(stale_dir, ignore_errors=True)
+        job_queue = JobQueue(self.queue_root / f"{self.run_name}-{uuid.uuid4().hex[:RUN_NONCE_LENGTH]}")
+        handler = handler_spec(func)
+        job_ids = [f"{i:05d}" for i in range(len(jobs))]
+        for job_id, job in zip(job_ids, jobs):
+            job_queue.publish(job_id, handler, job)
+        print(f"  [queue] Published {len(jobs)} jobs to {job_queue.path}")
+
+        results = [None] * len(jobs)
+        index_by_id = {job_id: i for i, job_id in enumerate(job_ids)}
+        local_processes = [self._start_local_worker() for _ in range(self.local_workers)]
+        try:
+            while any(entry is None for entry in results):
+                for i, process in enumerate(local_processes):
+                    if process.poll() is not None:
+                        print(f"  [queue] Local worker exited (code {process.returncode}), starting a new one")
+                        local_processes[i] = self._start_local_worker()
+
+                requeued = job_queue.requeue_expired(self.lease_seconds, self.max_attempts)
+                if requeued:
+                    self.requeued_jobs += len(requeued)
+                    print(f"  [queue] Lease expired, requeued: {', '.join(requeued)}")
+
+                for job_id in job_queue.finished_ids():
+                    index = index_by_id.get(job_id)
+                    if index is None or results[index] is not None:
+                        continue
+                    record = job_queue.result(job_id)
+                    if record is None:
+                        continue
+                    entry = {
+                        "job": jobs[index], "ok": record["ok"], "result": record["result"],
+                        "error": record["error"], "worker": record["worker"],
+                        "peak_rss_mb": record.get("peak_rss_mb", 0.0), "elapsed": record.get("elapsed", 0.0),
+                    }
+                    results[index] = entry
+                    if entry["worker"]:
+                        stats = self.worker_stats.setdefault(entry["worker"], {"jobs": 0, "peak": 0.0})
+                        stats["jobs"] += 1
+                        stats["peak"] = max(stats["peak"], entry["peak_rss_mb"])
+                    if on_result:
+                        on_result(entry)
+
+                if any(entry is None for entry in results):
+                    time.sleep(self.poll_interval)
+        finally:
+            for process in local_processes:
+                process.terminate()
+            for process in local_processes:
+                process.wait()
+            shutil.rmtree(job_queue.path, ignore_errors=True)
+        return results
+
+    def summary_lines(self) -> list[str]:
+        lines = [f"Queue workers used: {len(self.worker_stats)}"]
+        if self.requeued_jobs:
+            lines.append(f"Jobs requeued after an expired lease: {self.requeued_jobs}")
+        lines.append("Peak memory per worker:")
+        for name in sorted(self.worker_stats):
+            stats = self.worker_stats[name]
+            lines.append(f"  {name}: {stats['peak']:.0f} MB ({stats['jobs']} jobs)")
+        return lines
@@ -0,0 +1,44 @@
+import json
+from pathlib import Path
+
+from utils.ffmpeg_tools import probe_duration
+
+# The render plan is the planning work shared between runs and stages: probed durations, screen
+# hashes, audio checks and anything else that is expensive to work out but only depends on the inputs.
+# Every entry is keyed by the file's size and mtime, so it can never describe a file that changed.
+# Stage 2 writes it next to the clips; stage 3 and later runs (e.g. a final render after a
+# preview) read it back instead of probing every file again.
+
+def plan_path(clips_dir: Path, project_name: str) -> Path:
+    return Path(clips_dir) / f"{project_name}_plan.json"
+
+def load_plan(path: Path) -> dict:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_plan(path: Path, plan: dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(plan, indent=2, default=str), encoding="utf-8")
+    tmp_path.replace(path)
+
+def file_signature(path: Path) -> str:
+    stat = Path(path).stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def cached_duration(cache: dict, path: Path) -> float:
+    """
+    Returns the media duration of `path`, probing it only if the cache has no entry for the
+    file's current size and mtime. `cache` is a dict stored inside the plan and updated in place.
+    """
+    key = Path(path).as_posix()
+    signature = file_signature(path)
+    entry = cache.get(key)
+    if entry and entry.get("signature") == signature:
+        return entry["duration"]
+    duration = probe_duration(path)
+    cache[key] = {"signature": signature, "duration": duration}
+    return duration
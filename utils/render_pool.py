@@ -0,0 +1,305 @@
+import os
+import sys
+import shutil
+import time
+import multiprocessing as mp
+import queue
+from collections import deque
+from pathlib import Path
+
+# --- Default Limits ---
+# Stage scripts override these through the AdaptiveWorkerPool arguments.
+MIN_WORKERS = 1
+MAX_WORKERS = os.cpu_count() or 1
+MEMORY_BUDGET_MB = 8192       # Hard cap on the combined RSS of all running workers (incl. their ffmpeg children)
+MIN_FREE_DISK_MB = 2048       # No new workers are started below this much free space in the output directory
+TARGET_CPU_LOAD = 0.90        # Fraction of all cores; above this the pool stops growing and sheds workers
+SAMPLE_INTERVAL = 0.5         # Seconds between resource samples
+RESIZE_INTERVAL = 5.0         # Minimum seconds between worker count changes, so each change can be observed
+
+# --- Resource Sampling ---
+def _proc_rss_mb(pid: int) -> float:
+    """Reads VmRSS for a single process from /proc (Linux fallback when psutil is missing)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+def _proc_children(pid: int) -> list[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children", encoding="ascii") as f:
+                children.extend(int(c) for c in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return children
+
+def process_tree_rss_mb(pid: int) -> float:
+    """
+    Returns the resident memory of a process plus all of its descendants in MB.
+    The ffmpeg writers moviepy spawns are children of the worker, so they are counted too.
+    """
+    try:
+        import psutil
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + proc.children(recursive=True)
+            total = 0
+            for p in procs:
+                try:
+                    total += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total / (1024 * 1024)
+        except psutil.Error:
+            return 0.0
+    except ImportError:
+        total = 0.0
+        stack = [pid]
+        while stack:
+            current = stack.pop()
+            total += _proc_rss_mb(current)
+            stack.extend(_proc_children(current))
+        return total
+
+def available_memory_mb() -> float | None:
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        try:
+            with open("/proc/meminfo", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError):
+            pass
+    return None
+
+def cpu_load_fraction() -> float | None:
+    """System CPU load as a fraction of all cores (0.0 - 1.0+)."""
+    try:
+        import psutil
+        return psutil.cpu_percent(interval=None) / 100
+    except ImportError:
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return None
+
+def free_disk_mb(path: Path) -> float:
+    probe = Path(path)
+    while not probe.exists() and probe != probe.parent:
+        probe = probe.parent
+    return shutil.disk_usage(probe).free / (1024 * 1024)
+
+def _terminate_tree(proc: mp.Process):
+    try:
+        import psutil
+        try:
+            for child in psutil.Process(proc.pid).children(recursive=True):
+                child.kill()
+        except psutil.Error:
+            pass
+    except ImportError:
+        for child in _proc_children(proc.pid):
+            try:
+                os.kill(child, 9)
+            except OSError:
+                pass
+    proc.terminate()
+
+# --- Worker Entry Point ---
+def self_reported_peak_mb() -> float:
+    """Peak RSS of this worker plus its largest finished child, for jobs too short to be sampled."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / scale
+
+def _worker_main(func, index: int, job, result_queue):
+    start = time.time()
+    try:
+        result = func(job)
+        result_queue.put((index, True, result, None, time.time() - start, self_reported_peak_mb()))
+    except Exception as e:
+        result_queue.put((index, False, None, str(e), time.time() - start, self_reported_peak_mb()))
+
+# --- Adaptive Pool ---
+class AdaptiveWorkerPool:
+    """
+    Runs jobs in separate worker processes and adjusts how many run at once.
+
+    The pool starts at `min_workers` and adds a worker every RESIZE_INTERVAL seconds while CPU
+    load is below TARGET_CPU_LOAD and another worker's expected peak RSS fits in both the memory
+    budget and the system's available memory. It stops starting workers under CPU, memory or
+    disk pressure, and if the running workers together exceed the hard memory budget the newest
+    one is stopped and its job is put back in the queue.
+    """
+
+    def __init__(self, min_workers: int = MIN_WORKERS, max_workers: int = MAX_WORKERS,
+                 memory_budget_mb: float = MEMORY_BUDGET_MB, min_free_disk_mb: float = MIN_FREE_DISK_MB,
+                 disk_path: Path = Path("."), target_cpu_load: float = TARGET_CPU_LOAD):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.memory_budget_mb = memory_budget_mb
+        self.min_free_disk_mb = min_free_disk_mb
+        self.disk_path = Path(disk_path)
+        self.target_cpu_load = target_cpu_load
+        self.worker_peak_rss_mb = {}   # worker slot -> highest RSS seen for any job it ran
+        self.peak_active_workers = 0
+        self.requeued_jobs = 0
+
+    def _expected_job_rss_mb(self, running: dict) -> float:
+        observed = list(self.worker_peak_rss_mb.values()) + [state["peak"] for state in running.values()]
+        return max(observed, default=0.0)
+
+    def run(self, func, jobs: list, on_result=None) -> list[dict]:
+        """
+        Runs `func(job)` for every job and returns one result dict per job, in job order:
+        {"job", "ok", "result", "error", "worker", "peak_rss_mb", "elapsed"}.
+        `func` must be a module-level function so it can be sent to a worker process.
+        `on_result` is called in this process as each job finishes.
+        """
+        ctx = mp.get_context()
+        result_queue = ctx.Queue()
+        pending = deque(range(len(jobs)))
+        running = {}   # slot -> {"index", "process", "peak", "started"}
+        results = [None] * len(jobs)
+        target = self.min_workers
+        last_resize = time.time()
+        cpu_load_fraction()  # Prime psutil's cpu_percent so the first real sample is meaningful
+
+        def finish(slot, ok, value, error, elapsed, reported_peak=0.0):
+            state = running.pop(slot)
+            state["process"].join()
+            peak = max(state["peak"], reported_peak)
+            self.worker_peak_rss_mb[slot] = max(self.worker_peak_rss_mb.get(slot, 0.0), peak)
+            entry = {
+                "job": jobs[state["index"]], "ok": ok, "result": value, "error": error,
+                "worker": slot, "peak_rss_mb": peak, "elapsed": elapsed,
+            }
+            results[state["index"]] = entry
+            if on_result:
+                on_result(entry)
+
+        try:
+            while pending or running:
+                # 1. Collect finished jobs
+                while True:
+                    try:
+                        message = result_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    slot = next((s for s, st in running.items() if st["index"] == message[0]), None)
+                    if slot is not None:
+                        finish(slot, *message[1:])
+                for slot, state in list(running.items()):
+                    if slot in running and not state["process"].is_alive():
+                        # Give a result that is still in flight a moment to arrive before calling it a crash
+                        try:
+                            message = result_queue.get(timeout=SAMPLE_INTERVAL)
+                            done_slot = next((s for s, st in running.items() if st["index"] == message[0]), None)
+                            if done_slot is not None:
+                                finish(done_slot, *message[1:])
+                        except queue.Empty:
+                            code = state["process"].exitcode
+                            finish(slot, False, None, f"worker exited unexpectedly (exit code {code})",
+                                   time.time() - state["started"])
+
+                # 2. Sample resources
+                total_rss = 0.0
+                for state in running.values():
+                    rss = process_tree_rss_mb(state["process"].pid)
+                    state["peak"] = max(state["peak"], rss)
+                    total_rss += rss
+                cpu = cpu_load_fraction()
+                mem_available = available_memory_mb()
+                disk_free = free_disk_mb(self.disk_path)
+                expected_rss = self._expected_job_rss_mb(running)
+
+                # 3. Enforce the hard memory budget by shedding the newest worker
+                if total_rss > self.memory_budget_mb and len(running) > 1:
+                    newest = max(running, key=lambda s: running[s]["started"])
+                    state = running.pop(newest)
+                    _terminate_tree(state["process"])
+                    state["process"].join()
+                    pending.appendleft(state["index"])
+                    self.requeued_jobs += 1
+                    target = max(self.min_workers, len(running))
+                    last_resize = time.time()
+                    print(f"  [pool] Memory budget exceeded ({total_rss:.0f} MB > {self.memory_budget_mb:.0f} MB). "
+                          f"Requeued one job, running {len(running)} worker(s).")
+                    continue
+                if total_rss > self.memory_budget_mb and running:
+                    # A single job over budget can't be helped by running fewer workers: fail it
+                    slot = next(iter(running))
+                    state = running[slot]
+                    _terminate_tree(state["process"])
+                    finish(slot, False, None,
+                           f"job exceeded the memory budget on its own ({total_rss:.0f} MB > "
+                           f"{self.memory_budget_mb:.0f} MB); raise the budget or lower the job's size",
+                           time.time() - state["started"])
+                    continue
+
+                # 4. Resize within the configured limits
+                now = time.time()
+                overloaded = (
+                    (cpu is not None and cpu > self.target_cpu_load)
+                    or (mem_available is not None and mem_available < expected_rss)
+                    or disk_free < self.min_free_disk_mb
+                )
+                if now - last_resize >= RESIZE_INTERVAL:
+                    if overloaded and target > self.min_workers:
+                        target -= 1
+                        last_resize = now
+                    elif (not overloaded and target < self.max_workers and len(running) >= target
+                          and total_rss + expected_rss <= self.memory_budget_mb
+                          and (mem_available is None or mem_available > expected_rss * 1.5)):
+                        target += 1
+                        last_resize = now
+
+                # 5. Start workers up to the target
+                while pending and len(running) < target:
+                    if disk_free < self.min_free_disk_mb:
+                        if not running:
+                            raise RuntimeError(
+                                f"Only {disk_free:.0f} MB free under '{self.disk_path}' "
+                                f"(minimum {self.min_free_disk_mb:.0f} MB). Free up space and run again."
+                            )
+                        break
+                    if running and total_rss + expected_rss > self.memory_budget_mb:
+                        break
+                    slot = next(s for s in range(1, self.max_workers + 1) if s not in running)
+                    index = pending.popleft()
+                    process = ctx.Process(target=_worker_main, args=(func, index, jobs[index], result_queue))
+                    process.start()
+                    running[slot] = {"index": index, "process": process, "peak": 0.0, "started": time.time()}
+                    total_rss += expected_rss
+                self.peak_active_workers = max(self.peak_active_workers, len(running))
+
+                time.sleep(SAMPLE_INTERVAL)
+        finally:
+            for state in running.values():
+                _terminate_tree(state["process"])
+                state["process"].join()
+            result_queue.close()
+
+        return results
+
+    def summary_lines(self) -> list[str]:
+        lines = [f"Peak parallel workers: {self.peak_active_workers} (limits {self.min_workers}-{self.max_workers})"]
+        if self.requeued_jobs:
+            lines.append(f"Jobs requeued to stay within the memory budget: {self.requeued_jobs}")
+        lines.append("Peak memory per worker:")
+        for slot in sorted(self.worker_peak_rss_mb):
+            lines.append(f"  Worker {slot}: {self.worker_peak_rss_mb[slot]:.0f} MB")
+        return lines
@@ -0,0 +1,102 @@
+import re
+import sys
+import time
+import argparse
+import threading
+import importlib.util
+from pathlib import Path
+
+# Allow `python utils/render_worker.py ...` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.job_queue import JobQueue, LEASE_SECONDS, POLL_INTERVAL, worker_name
+from utils.render_pool import self_reported_peak_mb
+
+# Usage (run from the project root, on any node that sees the shared queue directory):
+#   python utils/render_worker.py /mnt/shared/stark-queue
+# The worker claims jobs from every run published under that directory, renews its lease while
+# working, writes the result back and moves on to the next job.
+
+_handlers = {}
+
+def load_handler(spec: str):
+    """Loads the '<script path>:<function>' a coordinator published, caching the module."""
+    if spec not in _handlers:
+        script_path, func_name = spec.rsplit(":", 1)
+        module_name = "stark_job_" + re.sub(r"\W", "_", Path(script_path).stem)
+        module = sys.modules.get(module_name)
+        if module is None:
+            module_spec = importlib.util.spec_from_file_location(module_name, script_path)
+            module = importlib.util.module_from_spec(module_spec)
+            sys.modules[module_name] = module
+            module_spec.loader.exec_module(module)
+        _handlers[spec] = getattr(module, func_name)
+    return _handlers[spec]
+
+def run_job(job_queue: JobQueue, record: dict, lease_seconds: float):
+    job_id = record["id"]
+    stop = threading.Event()
+
+    def keep_lease():
+        while not stop.wait(lease_seconds / 3):
+            if not job_queue.heartbeat(job_id):
+                print(f"  Warning: lease on {job_id} was lost; finishing it anyway.", flush=True)
+                return
+
+    heartbeat = threading.Thread(target=keep_lease, daemon=True)
+    heartbeat.start()
+    start = time.time()
+    try:
+        result = load_handler(record["handler"])(record["payload"])
+        outcome = {"ok": True, "result": result, "error": None}
+    except Exception as e:
+        outcome = {"ok": False, "result": None, "error": str(e)}
+    finally:
+        stop.set()
+        heartbeat.join()
+    if not job_queue.complete(job_id, dict(outcome, worker=worker_name(), elapsed=time.time() - start,
+                                           peak_rss_mb=self_reported_peak_mb())):
+        print(f"  Run {job_queue.path.name} was withdrawn; result of {job_id} discarded.", flush=True)
+    return outcome["ok"]
+
+def claim_next(queue_root: Path) -> tuple[JobQueue, dict] | tuple[None, None]:
+    for run_dir in sorted(p for p in queue_root.iterdir() if (p / "pending").is_dir()):
+        # Never recreate the directories of a run the coordinator has just withdrawn
+        job_queue = JobQueue(run_dir, create=False)
+        record = job_queue.claim()
+        if record:
+            return job_queue, record
+    return None, None
+
+def main():
+    parser = argparse.ArgumentParser(description="Stark render worker for the shared-directory job queue.")
+    parser.add_argument("queue_root", type=Path, help="Shared queue directory the coordinator publishes to")
+    parser.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS)
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--exit-when-idle", type=float, default=None, metavar="SECONDS",
+                        help="Exit after this long without work (default: run until stopped)")
+    args = parser.parse_args()
+
+    print(f"--- Stark Render Worker {worker_name()} ---", flush=True)
+    print(f"Queue: {args.queue_root}", flush=True)
+    args.queue_root.mkdir(parents=True, exist_ok=True)
+    idle_since = time.time()
+    jobs_done = 0
+
+    while True:
+        job_queue, record = claim_next(args.queue_root)
+        if record is None:
+            if args.exit_when_idle is not None and time.time() - idle_since >= args.exit_when_idle:
+                break
+            time.sleep(args.poll_interval)
+            continue
+
+        print(f"Claimed {job_queue.path.name}/{record['id']} (attempt {record.get('attempts', 0) + 1})", flush=True)
+        ok = run_job(job_queue, record, args.lease_seconds)
+        jobs_done += 1
+        print(f"{'Finished' if ok else 'Failed'} {job_queue.path.name}/{record['id']}", flush=True)
+        idle_since = time.time()
+
+    print(f"Worker idle, exiting. Jobs processed: {jobs_done}", flush=True)
+
+if __name__ == "__main__":
+    main()
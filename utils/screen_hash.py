@@ -0,0 +1,98 @@
+import hashlib
+from pathlib import Path
+
+from utils.render_plan import file_signature
+
+# Duplicate-screen detection for stage 2.
+# Screens are compared by SHA-256 of the file bytes (exact repeats) and by a 64-bit difference
+# hash (dHash) of the upright, greyscale image (re-exports, recompressed or slightly touched-up
+# copies of the same screen). Hashes are cached in the render plan by file size and mtime.
+# A 64-bit dHash can't see a changed line of code on a UI screenshot, so a perceptual match is only
+# trusted after a full-resolution pixel comparison confirms it.
+
+PIXEL_NOISE_LEVEL = 32            # Per-channel difference (0-255) above which a pixel counts as changed
+MAX_CHANGED_PIXEL_FRACTION = 0.0002   # Share of changed pixels two copies of one screen may have
+MAX_MEAN_DIFFERENCE = 1.5         # Mean absolute per-channel difference (0-255) allowed for recompression noise
+
+def content_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def perceptual_hash(path: Path) -> int:
+    """dHash: shrink to 9x8 greyscale and record whether each pixel is brighter than its right neighbour."""
+    from PIL import Image, ImageOps
+    from PIL.Image import Resampling
+    import numpy as np
+
+    with Image.open(path) as img:
+        small = ImageOps.exif_transpose(img).convert("L").resize((9, 8), Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def load_pixels(path: Path, size: tuple[int, int]):
+    """The upright RGB image at `size`, as the clip renderer would draw it."""
+    from PIL import Image, ImageOps
+    from PIL.Image import Resampling
+    import numpy as np
+
+    with Image.open(path) as img:
+        return np.asarray(ImageOps.exif_transpose(img).convert("RGB").resize(size, Resampling.LANCZOS), dtype=np.int16)
+
+def pixels_match(path_a: Path, path_b: Path, size: tuple[int, int]) -> bool:
+    """Full-resolution check that two images only differ by compression noise."""
+    import numpy as np
+
+    difference = np.abs(load_pixels(path_a, size) - load_pixels(path_b, size))
+    changed = np.mean(difference.max(axis=2) > PIXEL_NOISE_LEVEL)
+    return changed <= MAX_CHANGED_PIXEL_FRACTION and difference.mean() <= MAX_MEAN_DIFFERENCE
+
+def _cached_hashes(cache: dict, path: Path) -> tuple[str, int]:
+    key = Path(path).as_posix()
+    signature = file_signature(path)
+    entry = cache.get(key)
+    if not entry or entry.get("signature") != signature:
+        entry = {"signature": signature, "sha256": content_hash(path), "dhash": perceptual_hash(path)}
+        cache[key] = entry
+    return entry["sha256"], entry["dhash"]
+
+def group_duplicate_screens(image_paths: list[Path], max_distance: int, cache: dict,
+                            compare_size: tuple[int, int] = (1920, 1080)) -> dict[Path, Path]:
+    """
+    Maps every image to the representative screen it duplicates (the first occurrence in
+    `image_paths`), or to itself. With `max_distance` 0 only byte-identical files are grouped.
+    Otherwise images whose dHashes differ in at most `max_distance` bits are candidates, and one
+    joins a group only if pixels_match() at `compare_size` confirms it.
+    """
+    import numpy as np
+
+    representative_by_sha = {}
+    representatives = []        # Paths of the group representatives, in order of first appearance
+    representative_hashes = []  # Their dHashes, compared against each new screen in one vectorized pass
+    mapping = {}
+
+    for path in image_paths:
+        sha, dhash = _cached_hashes(cache, path)
+        if sha in representative_by_sha:
+            mapping[path] = representative_by_sha[sha]
+            continue
+
+        if max_distance > 0 and representatives:
+            diffs = np.bitwise_xor(np.array(representative_hashes, dtype=np.uint64), np.uint64(dhash))
+            distances = np.unpackbits(diffs.view(np.uint8)).reshape(len(diffs), 64).sum(axis=1)
+            candidates = [int(i) for i in np.argsort(distances, kind="stable") if distances[i] <= max_distance]
+            match = next((representatives[i] for i in candidates
+                          if pixels_match(representatives[i], path, compare_size)), None)
+            if match is not None:
+                mapping[path] = match
+                representative_by_sha[sha] = match
+                continue
+
+        representative_by_sha[sha] = path
+        representatives.append(path)
+        representative_hashes.append(dhash)
+        mapping[path] = path
+    return mapping
@@ -0,0 +1,208 @@
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Allow `python utils/script_corpus.py ...` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.render_plan import load_plan, save_plan, file_signature
+
+# Word-count and timing analysis for whole script libraries.
+# Every .txt under the given directories is counted once; the stats are cached in a JSON file keyed
+# by size and mtime, with the content hash as a second check, so touched-but-unchanged files are not
+# counted again. Each subdirectory of a scanned directory is reported as its own project.
+# Usage (from the project root): python utils/script_corpus.py [dirs...] [--json report.json]
+
+SCRIPTS_DIR = Path("selected_scripts")
+# Kept with stage 1's generated files rather than next to the scripts, so it never gets committed with them
+CACHE_PATH = Path("1-audio_gen/output_audio") / "_script_stats.json"
+CHUNK_LIMIT = 3500          # Same character limit the synthesizers split scripts at
+WORDS_PER_SECOND = 2.5      # Average speaking rate: 150 words per minute
+PARALLEL_MIN_FILES = 64     # Below this many uncached files, counting in-process is faster than a pool
+
+# str.split() separators in the ASCII range: \t \n \v \f \r, the \x1c-\x1f separators and space
+_ASCII_WHITESPACE = b"\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f "
+
+def count_words(data: bytes) -> int:
+    """
+    Counts words exactly as len(text.split()) would. ASCII text is counted in one vectorized pass
+    over the bytes (every whitespace-to-word transition starts a word); anything else is decoded and split.
+    """
+    import numpy as np
+
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return 0
+    if raw.max() >= 0x80:
+        return len(data.decode("utf-8").split())
+    is_space = np.zeros(256, dtype=bool)
+    is_space[np.frombuffer(_ASCII_WHITESPACE, dtype=np.uint8)] = True
+    in_word = ~is_space[raw]
+    return int(in_word[0]) + int(np.count_nonzero(in_word[1:] & ~in_word[:-1]))
+
+def count_chunks(text: str, limit: int) -> int:
+    """Number of TTS requests split_text() in the synthesizers makes for `text`, without building the chunks."""
+    chunks = 1
+    current = 0
+    for length in map(len, text.split("\n\n")):
+        if current + length + 2 < limit:
+            current += length + 2
+        else:
+            chunks += 1
+            current = length + 2
+    return chunks
+
+def analyze_file(path: str, chunk_limit: int) -> dict:
+    """Reads one script and returns its stats. Runs in a worker process for large scans."""
+    data = Path(path).read_bytes()
+    text = data.decode("utf-8")
+    return {
+        "signature": file_signature(path),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "chunk_limit": chunk_limit,
+        "words": count_words(data),
+        "chars": len(text),
+        "chunks": count_chunks(text, chunk_limit),
+    }
+
+def _cached_stats(entry: dict | None, path: Path, chunk_limit: int) -> dict | None:
+    if not entry or entry.get("chunk_limit") != chunk_limit:
+        return None
+    if entry.get("signature") == file_signature(path):
+        return entry
+    # Touched but possibly unchanged (checkout, copy): fall back to the content hash
+    if entry.get("sha256") == hashlib.sha256(path.read_bytes()).hexdigest():
+        entry["signature"] = file_signature(path)
+        return entry
+    return None
+
+def find_scripts(roots: list[Path], recursive: bool = True) -> dict[Path, str]:
+    """
+    Maps every script under `roots` to its project: the first subdirectory, or the root for loose files.
+    With `recursive` off only the scripts directly in each root are included.
+    """
+    scripts = {}
+    for root in roots:
+        for path in sorted(Path(root).rglob("*.txt") if recursive else Path(root).glob("*.txt")):
+            relative = path.relative_to(root)
+            scripts[path] = relative.parts[0] if len(relative.parts) > 1 else Path(root).resolve().name
+    return scripts
+
+def scan_scripts(roots: list[Path], chunk_limit: int = CHUNK_LIMIT, cache_path: Path | None = CACHE_PATH,
+                 max_workers: int | None = None, recursive: bool = True) -> dict:
+    """
+    Returns the corpus report: per-script stats under "scripts" (keyed by posix path), per-project
+    totals under "projects" and the overall "total". Only new or changed files are read; the cache
+    at `cache_path` is updated afterwards (pass None to skip caching). Tools that only work on the
+    top level of a script folder pass `recursive=False`, so the rest of the library isn't read.
+    """
+    scripts = find_scripts(roots, recursive)
+    cache = load_plan(cache_path).get("files", {}) if cache_path else {}
+    stats = {}
+    errors = {}
+    to_analyze = []
+    refreshed = False
+    for path in scripts:
+        try:
+            key = path.resolve().as_posix()
+            signature = cache.get(key, {}).get("signature")
+            entry = _cached_stats(cache.get(key), path, chunk_limit)
+            refreshed = refreshed or bool(entry and entry["signature"] != signature)
+        except OSError as e:
+            errors[path] = str(e)
+            continue
+        if entry:
+            stats[path] = entry
+        else:
+            to_analyze.append(path)
+
+    if len(to_analyze) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {path: executor.submit(analyze_file, str(path), chunk_limit) for path in to_analyze}
+            for path, future in futures.items():
+                try:
+                    stats[path] = future.result()
+                except Exception as e:
+                    errors[path] = str(e)
+    else:
+        for path in to_analyze:
+            try:
+                stats[path] = analyze_file(str(path), chunk_limit)
+            except Exception as e:
+                errors[path] = str(e)
+
+    if cache_path and (to_analyze or refreshed):
+        cache.update({path.resolve().as_posix(): entry for path, entry in stats.items()})
+        save_plan(cache_path, {"files": {key: entry for key, entry in cache.items() if Path(key).exists()}})
+
+    def totals(entries: list[dict]) -> dict:
+        words = sum(entry["words"] for entry in entries)
+        return {"files": len(entries), "words": words, "chunks": sum(entry["chunks"] for entry in entries),
+                "estimated_seconds": words / WORDS_PER_SECOND}
+
+    report = {"chunk_limit": chunk_limit, "words_per_second": WORDS_PER_SECOND, "scripts": {}, "projects": {}}
+    by_project = {}
+    for path, project in scripts.items():
+        if path in errors:
+            report["scripts"][path.as_posix()] = {"project": project, "error": errors[path]}
+            continue
+        entry = stats[path]
+        report["scripts"][path.as_posix()] = {
+            "project": project, "words": entry["words"], "chars": entry["chars"], "chunks": entry["chunks"],
+            "estimated_seconds": entry["words"] / WORDS_PER_SECOND,
+        }
+        by_project.setdefault(project, []).append(entry)
+    report["projects"] = {project: totals(entries) for project, entries in by_project.items()}
+    report["total"] = totals([entry for entries in by_project.values() for entry in entries])
+    return report
+
+def format_seconds_to_min_sec(seconds: float) -> str:
+    minutes = int(seconds // 60)
+    remaining_seconds = int(seconds % 60)
+    time_str = ""
+    if minutes > 0:
+        time_str += f"{minutes} min "
+    time_str += f"{remaining_seconds} sec"
+    return time_str
+
+def main():
+    parser = argparse.ArgumentParser(description="Stark script corpus analyzer: word counts, TTS chunks and estimated audio length.")
+    parser.add_argument("dirs", type=Path, nargs="*", default=[SCRIPTS_DIR], help="Script directories (default: selected_scripts)")
+    parser.add_argument("--chunk-limit", type=int, default=CHUNK_LIMIT)
+    parser.add_argument("--cache", type=Path, default=CACHE_PATH, help="Stats cache file")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--json", type=Path, default=None, metavar="PATH", help="Also write the full report as JSON ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    missing = [d for d in args.dirs if not d.is_dir()]
+    if missing:
+        print(f"Error: Script directory '{missing[0]}' not found.")
+        return False
+
+    report = scan_scripts(args.dirs, args.chunk_limit, None if args.no_cache else args.cache, args.workers)
+    if args.json == Path("-"):
+        print(json.dumps(report, indent=2))
+        return True
+    if args.json:
+        save_plan(args.json, report)
+
+    print(f"\n--- Script Corpus: {', '.join(str(d) for d in args.dirs)} (chunk limit {args.chunk_limit}) ---")
+    for project, summary in sorted(report["projects"].items()):
+        print(f"{project} --> {summary['files']} scripts --> {summary['words']} words --> "
+              f"{summary['chunks']} chunks --> {format_seconds_to_min_sec(summary['estimated_seconds'])}")
+    failed = [(path, entry["error"]) for path, entry in report["scripts"].items() if "error" in entry]
+    for path, error in failed:
+        print(f"Error processing {path}: {error}")
+    print("----------------------------------------------------------")
+    total = report["total"]
+    print(f"Total --> {total['files']} scripts --> {total['words']} words --> {total['chunks']} chunks --> "
+          f"{format_seconds_to_min_sec(total['estimated_seconds'])}")
+    if args.json:
+        print(f"Report written to: {args.json}")
+    return not failed
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,79 @@
+import shutil
+import queue
+import threading
+import urllib.request
+from pathlib import Path
+
+# Background uploader for finished output files.
+# Files are pushed one at a time, in the order they were submitted, so a playlist submitted after
+# its media segments is never published before them. The destination is either a directory
+# (e.g. a synced or mounted share) or an http(s) URL that accepts PUT requests.
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".mp4": "video/mp4",
+    ".m4a": "audio/mp4",
+    ".vtt": "text/vtt",
+}
+HTTP_TIMEOUT = 120   # Seconds per request
+
+class BackgroundUploader:
+    def __init__(self, destination: str | Path):
+        self.destination = str(destination)
+        self.is_http = self.destination.startswith(("http://", "https://"))
+        self.uploaded = 0
+        self.errors = []
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, path: Path, name: str | None = None, snapshot: bool = False):
+        """
+        Queues `path` for upload as `name` (default: its file name). Returns immediately.
+        With `snapshot`, the file is read now, so a file that keeps being rewritten (a live playlist)
+        is uploaded as it was when submitted rather than as it is when its turn comes.
+        """
+        data = Path(path).read_bytes() if snapshot else None
+        self._queue.put((Path(path), name or Path(path).name, data))
+
+    def close(self):
+        """Waits for every queued upload to finish. Safe to call more than once."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while (task := self._queue.get()) is not None:
+            path, name, data = task
+            try:
+                self._upload(path, name, data)
+                self.uploaded += 1
+            except Exception as e:
+                self.errors.append(f"{name}: {e}")
+
+    def _put(self, url: str, body, length: int, content_type: str):
+        request = urllib.request.Request(url, data=body, method="PUT",
+                                         headers={"Content-Type": content_type, "Content-Length": str(length)})
+        with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT):
+            pass
+
+    def _upload(self, path: Path, name: str, data: bytes | None):
+        if self.is_http:
+            url = f"{self.destination.rstrip('/')}/{name}"
+            content_type = CONTENT_TYPES.get(path.suffix.lower(), "application/octet-stream")
+            if data is not None:
+                self._put(url, data, len(data), content_type)
+            else:
+                # Stream from disk: full course videos can be several GB
+                with open(path, "rb") as f:
+                    self._put(url, f, path.stat().st_size, content_type)
+        else:
+            target = Path(self.destination) / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_target = target.with_name(target.name + ".part")
+            if data is None:
+                shutil.copyfile(path, tmp_target)
+            else:
+                tmp_target.write_bytes(data)
+            tmp_target.replace(target)   # Readers never see a half-copied file